@@ -1,108 +1,165 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime
-from app.utils.database_utils import (
-    create_resident, get_resident_by_tg_id, create_car, get_car_by_plate_and_owner,
-    get_free_parking_spots, create_booking, cancel_booking, get_resident_bookings,
-    get_cars_by_tg_id
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+from app.utils.async_database_utils import (
+    create_resident, get_resident_by_tg_id, create_car, get_car_by_plate, PlateTakenError,
+    get_free_parking_spots, create_booking, cancel_booking, get_bookings_by_tg_id,
+    get_cars_by_tg_id, get_reservation_context, stream_free_parking_spots, SpotUnavailableError,
+    SpotBusyError
 )
-from app.db.database import SessionLocal
-from app.db.models import ParkingSpot
+from app.db.schemas import CarOut, SpotOut
+from app.utils.streaming import ndjson_response, check_page_limit
+from app.utils.availability_index import availability_index, AVAILABILITY_REFRESH_SECONDS
+from app.db.database import get_db, SessionLocal
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/booking", tags=["Модуль бронирования парковочного места"])
 
-def get_db():
+# Окно поиска свободных мест по умолчанию (сек), если конец окна не указан
+FREE_SPOTS_DEFAULT_WINDOW = float(os.getenv("FREE_SPOTS_DEFAULT_WINDOW", "3600"))
+
+
+# Обновление индекса занятости мест из БД (выполняется в отдельном потоке)
+def refresh_availability_index():
     db = SessionLocal()
     try:
-        yield db
+        availability_index.refresh(db)
     finally:
         db.close()
 
 
+async def availability_index_refresher():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(AVAILABILITY_REFRESH_SECONDS)
+        try:
+            await loop.run_in_executor(None, refresh_availability_index)
+        except Exception:
+            logger.exception("Ошибка обновления индекса занятости мест")
+
+
+# Окно [start, end) из unix-времени запроса; по умолчанию - от текущего момента
+def booking_window(start_time: Optional[float], end_time: Optional[float]):
+    start = datetime.fromtimestamp(start_time) if start_time is not None else datetime.now()
+    end = datetime.fromtimestamp(end_time) if end_time is not None else start + timedelta(seconds=FREE_SPOTS_DEFAULT_WINDOW)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end_time must be greater than start_time")
+    return start, end
+
+
 @router.post("/register")
-async def register_resident(tg_id: int, db: Session = Depends(get_db)):
+async def register_resident(tg_id: int, db: AsyncSession = Depends(get_db)):
     """
     Эндпоинт для регистрации жителя.
     """
-    existing_resident = get_resident_by_tg_id(db, tg_id)
+    existing_resident = await get_resident_by_tg_id(db, tg_id)
     if existing_resident:
         raise HTTPException(status_code=400, detail="Resident with this tg_id already exists")
 
-    new_resident = create_resident(db, tg_id)
+    new_resident = await create_resident(db, tg_id)
     return {"message": "Resident registered successfully", "id": new_resident.id}
 
 
 @router.post("/register-car")
-async def register_car(tg_id: int, car_plate: str, db: Session = Depends(get_db)):
+async def register_car(tg_id: int, car_plate: str, db: AsyncSession = Depends(get_db)):
     """
     Эндпоинт для регистрации номера машины.
     """
-    resident = get_resident_by_tg_id(db, tg_id)
+    resident = await get_resident_by_tg_id(db, tg_id)
     if not resident:
         raise HTTPException(status_code=404, detail="Resident not found")
 
-    existing_car = get_car_by_plate_and_owner(db, car_plate, resident.id)
+    # Номер уникален по каноническому ключу у всех жителей: иначе решение шлагбаума неоднозначно
+    existing_car = await get_car_by_plate(db, car_plate)
     if existing_car:
-        raise HTTPException(status_code=400, detail="Car with this plate already exists")
+        if existing_car.owner_id == resident.id:
+            raise HTTPException(status_code=400, detail="Car with this plate already exists")
+        raise HTTPException(status_code=400, detail="Car with this plate is registered by another resident")
 
-    new_car = create_car(db, resident.id, car_plate)
+    try:
+        new_car = await create_car(db, resident.id, car_plate)
+    except PlateTakenError:
+        raise HTTPException(status_code=400, detail="Car with this plate already exists")
     return {"message": "Car registered successfully", "id": new_car.id}
 
 
 @router.get("/get-free-spots")
-async def get_free_spots(db: Session = Depends(get_db)):
+async def get_free_spots(response: Response, start_time: Optional[float] = None, end_time: Optional[float] = None,
+                         after_id: Optional[int] = None, limit: Optional[int] = None, stream: bool = False,
+                         db: AsyncSession = Depends(get_db)):
     """
-    Эндпоинт для получения свободных парковочных мест.
+    Эндпоинт для получения свободных парковочных мест в окне [start_time, end_time) (unix-время;
+    по умолчанию - ближайший час от текущего момента).
+    Постранично: after_id и limit, id последнего места страницы - в заголовке X-Next-After-Id.
+    stream=true - все места потоком NDJSON.
+    Ответ берется из индекса в памяти: брони из других процессов видны с задержкой до
+    AVAILABILITY_REFRESH_SECONDS, поэтому место из списка может оказаться занятым - окончательно
+    занятость проверяет /booking/reserve-parking в БД.
     """
-    free_spots = get_free_parking_spots(db)
-    spots_list = [{"id": spot.id, "parking_spot_number": spot.parking_spot_number, "description": spot.description} for spot in free_spots]
-    return spots_list
+    start, end = booking_window(start_time, end_time)
+    if stream:
+        return ndjson_response(stream_free_parking_spots, start, end, after_id)
+    if limit is not None:
+        check_page_limit(limit)
+    if availability_index.loaded:
+        spots = availability_index.free_spots(start, end, after_id, limit)
+    else:
+        spots = await get_free_parking_spots(db, start, end, after_id, limit)
+    if limit is not None and len(spots) == limit:
+        response.headers["X-Next-After-Id"] = str(spots[-1].id)
+    return [SpotOut.model_validate(spot) for spot in spots]
 
 
 @router.post("/reserve-parking")
 async def reserve_parking(tg_id: int, place_id: int, car_plate: str, start_time: float, end_time: float,
-                          db: Session = Depends(get_db)):
+                          db: AsyncSession = Depends(get_db)):
     """
     Эндпоинт для бронирования парковочного места.
     """
-    resident = get_resident_by_tg_id(db, tg_id)
-    if not resident:
+    start, end = booking_window(start_time, end_time)
+    context = await get_reservation_context(db, tg_id, car_plate, place_id, start, end)
+    if not context:
         raise HTTPException(status_code=404, detail="Resident not found")
-
-    car = get_car_by_plate_and_owner(db, car_plate, resident.id)
-    if not car:
+    if context.car_plate is None:
         raise HTTPException(status_code=404, detail="Car not found")
-
-    spot = db.query(ParkingSpot).filter_by(id=place_id).first()
-    if not spot or spot.is_reserved:
+    if context.spot_id is None or context.is_booked:
         raise HTTPException(status_code=400, detail="Parking spot is not available")
 
-    booking = create_booking(db, resident.id, spot.id, car.car_plate, datetime.fromtimestamp(start_time),
-                             datetime.fromtimestamp(end_time))
+    try:
+        booking = await create_booking(db, context.resident_id, context.spot_id, context.car_plate, start, end)
+    except SpotUnavailableError:
+        raise HTTPException(status_code=400, detail="Parking spot is not available")
+    except SpotBusyError:
+        raise HTTPException(status_code=409, detail="Parking spot is being reserved, try again",
+                            headers={"Retry-After": "1"})
     return {"message": "Spot booked successfully", "booking_id": booking.id}
 
 
 @router.delete("/cancel-reservation/{reservation_id}")
-async def cancel_reservation(reservation_id: int, db: Session = Depends(get_db)):
+async def cancel_reservation(reservation_id: int, db: AsyncSession = Depends(get_db)):
     """
     Эндпоинт для снятия брони.
     """
-    booking = cancel_booking(db, reservation_id)
+    booking = await cancel_booking(db, reservation_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     return {"message": "Reservation canceled successfully"}
 
 
 @router.get("/view-reservations")
-async def view_reservations(tg_id: int, db: Session = Depends(get_db)):
+async def view_reservations(tg_id: int, db: AsyncSession = Depends(get_db)):
     """
     Эндпоинт для просмотра бронирований.
     """
-    resident = get_resident_by_tg_id(db, tg_id)
-    if not resident:
+    bookings = await get_bookings_by_tg_id(db, tg_id)
+    if not bookings:
         raise HTTPException(status_code=404, detail="Resident not found")
 
-    bookings = get_resident_bookings(db, resident.id)
     bookings_list = [
         {
             "id": booking.id,
@@ -110,18 +167,18 @@ async def view_reservations(tg_id: int, db: Session = Depends(get_db)):
             "car_plate": booking.car_plate,
             "start_time": booking.start_time.timestamp(),
             "end_time": booking.end_time.timestamp()
-        } for booking in bookings
+        } for booking in bookings if booking.id is not None
     ]
     return bookings_list
 
 
 # Получение всех автомобилей для конкретного жителя по tg_id
 @router.get("/residents/tg_id/{tg_id}/cars")
-async def get_resident_cars(tg_id: int, db: Session = Depends(get_db)):
+async def get_resident_cars(tg_id: int, db: AsyncSession = Depends(get_db)):
     """
     Получение всех автомобилей для конкретного жителя по tg_id.
     """
-    cars = get_cars_by_tg_id(db, tg_id)
+    cars = await get_cars_by_tg_id(db, tg_id)
     if not cars:
         raise HTTPException(status_code=404, detail="No cars found for this resident")
-    return {"cars": cars}
\ No newline at end of file
+    return {"cars": [CarOut.model_validate(car) for car in cars]}
\ No newline at end of file
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+import asyncio
+import logging
+from app.controllers.ml_controller import recognize_image, check_max_plates
+from app.db.database import SessionLocal
+from app.utils.booking_changes import changes_watermark, prune_changes
+from app.utils.image_utils import read_upload_image
+from app.utils.plate_index import (
+    active_plate_index, registered_plate_index, load_registered_plates, GATE_INDEX_REFRESH_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/gate", tags=["Модуль шлагбаума"])
+
+
+# Обновление индексов номеров из БД (выполняется в отдельном потоке).
+# Зарегистрированные номера загружаются один раз, дальше индекс меняется при добавлении и удалении автомобилей.
+# Вместе с полной перезагрузкой чистится журнал изменений бронирований
+def refresh_plate_index():
+    db = SessionLocal()
+    try:
+        if active_plate_index.refresh(db):
+            prune_changes(db, changes_watermark(db))
+        if not registered_plate_index.loaded:
+            load_registered_plates(db)
+    finally:
+        db.close()
+
+
+# Фоновое обновление индекса, чтобы решение на шлагбауме не ждало Postgres
+async def plate_index_refresher():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(GATE_INDEX_REFRESH_SECONDS)
+        try:
+            await loop.run_in_executor(None, refresh_plate_index)
+        except Exception:
+            logger.exception("Ошибка обновления индекса номеров")
+
+
+@router.post("/check")
+async def check_gate_access(file: UploadFile = File(...), max_plates: int = 2):
+    """
+    Распознавание номера и решение об открытии шлагбаума за один вызов:
+    allow, если для номера есть действующее бронирование. Номер сопоставляется
+    по каноническому ключу с допуском только на дешевые путаницы OCR (О/0, В/8 и т.п.).
+    """
+    check_max_plates(max_plates)
+    image = await read_upload_image(file)
+    # Без кэша: кадры неподвижной камеры у шлагбаума почти совпадают, и следующая машина в очереди
+    # получила бы номер и решение предыдущей
+    result = await recognize_image(image, use_cache=False, max_plates=max_plates)
+    if "license_plate" not in result:
+        return {"decision": "deny", "reason": result.get("message"), "license_plate": None, "booking_id": None}
+
+    plates = [plate for plate in result["plates"] if plate["license_plate"] is not None]
+    for plate in plates:
+        found = active_plate_index.match(plate["license_plate"])
+        if found is not None:
+            return {
+                "decision": "allow",
+                "license_plate": plate["license_plate"],
+                "confidence": plate["confidence"],
+                "booking_id": found["booking_id"],
+                "matched_plate": found["plate_key"],
+                "match_cost": found["cost"]
+            }
+
+    return {
+        "decision": "deny",
+        "reason": "Нет действующего бронирования",
+        "license_plate": plates[0]["license_plate"],
+        "confidence": plates[0]["confidence"],
+        "booking_id": None
+    }
+
+
+@router.get("/lookup")
+async def lookup_plate(plate: str, max_cost: Optional[float] = None, limit: int = 5):
+    """
+    Зарегистрированные номера, близкие к переданному с учетом ошибок OCR.
+    """
+    cost_limit = registered_plate_index.cost_limit
+    if max_cost is not None and not 0 <= max_cost < cost_limit:
+        raise HTTPException(status_code=400, detail=f"max_cost должен быть от 0 до {cost_limit} (не включая)")
+    if not 1 <= limit <= 50:
+        raise HTTPException(status_code=400, detail="limit должен быть от 1 до 50")
+    # Поиск в потоке: расстояния до кандидатов считаются на CPU и не должны задерживать цикл событий
+    candidates = await run_in_threadpool(registered_plate_index.search, plate, max_cost, limit)
+    return {
+        "query": plate,
+        "candidates": [
+            {"plate_key": key, "car_plate": car_plate, "cost": cost} for key, car_plate, cost in candidates
+        ]
+    }
+
+
+@router.get("/index-stats")
+async def gate_index_stats():
+    """
+    Состояние индекса номеров с действующими бронированиями.
+    """
+    return active_plate_index.stats()
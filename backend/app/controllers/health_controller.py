@@ -0,0 +1,78 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+import asyncio
+import time
+from app.db.database import SessionLocal, AsyncSessionLocal, pool_stats
+from app.utils.model_registry import model_registry
+from app.utils.inference_pool import inference_pool
+from app.utils.warmup import warmup_tracker
+
+router = APIRouter(prefix="/health", tags=["Состояние сервиса"])
+
+
+# Проверка подключения к БД: SELECT 1 через синхронный пул соединений (фоновые задачи, индексы)
+def check_database():
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000.0, "error": None}
+    except Exception as e:
+        return {"ok": False, "latency_ms": None, "error": repr(e)}
+    finally:
+        db.close()
+
+
+# То же через асинхронный пул, которым обслуживаются запросы роутеров
+async def check_async_database():
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+        return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000.0, "error": None}
+    except Exception as e:
+        return {"ok": False, "latency_ms": None, "error": repr(e)}
+
+
+def model_versions():
+    return {info["name"]: info["version"] for info in model_registry.info()}
+
+
+@router.get("/live")
+async def liveness():
+    """
+    Процесс запущен и обрабатывает запросы.
+    """
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    Готовность принимать трафик: модели прогреты и БД отвечает через оба пула соединений.
+    Возвращает 503, пока условия не выполнены; в ответе - время прогрева и версии моделей.
+    """
+    loop = asyncio.get_running_loop()
+    database, async_database = await asyncio.gather(
+        loop.run_in_executor(None, check_database), check_async_database()
+    )
+    ready = warmup_tracker.ready and database["ok"] and async_database["ok"]
+    payload = {
+        "ready": ready,
+        "warmup": warmup_tracker.snapshot(),
+        "database": database,
+        "async_database": async_database,
+        "models": model_versions(),
+        "inference_workers": inference_pool.workers,
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=payload)
+
+
+@router.get("/db-pool")
+async def database_pool_stats():
+    """
+    Состояние пулов соединений с БД: выданные и свободные соединения,
+    гистограмма ожидания выдачи соединения, таймауты и оборот соединений.
+    """
+    return {name: stats.snapshot() for name, stats in pool_stats.items()}
@@ -1,21 +1,78 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
+from functools import partial
+import asyncio
+import os
 import cv2
-from ultralytics import YOLO
-import tempfile
-import easyocr
+import numpy as np
+from app.utils.image_utils import read_upload, read_upload_image, decode_upload_image
+from app.utils.batching import MicroBatcher
+from concurrent.futures.process import BrokenProcessPool
+from app.utils.inference_pool import inference_pool, PoolSaturatedError
+from app.utils.detector_backends import register_detector
+from app.utils.model_registry import model_registry, resolve_weights_path
+from app.utils.result_cache import PerceptualCache, dhash
+from app.utils.plate_recognizer import CascadeRecognizer, PathStats
+from app.utils.job_queue import JobQueue, QueueFullError
+from app.utils.warmup import warmup_tracker, ML_WARMUP_TIMEOUT
 
-model = YOLO("/app/best.pt")
+DETECTOR = register_detector(model_registry)
+
+def get_detector():
+    return model_registry.get(DETECTOR)
+
+# Кэш результатов распознавания для повторяющихся кадров с камер шлагбаума
+recognition_cache = PerceptualCache()
+
+def recognition_version():
+    return "|".join(f"{info['name']}={info['version']}" for info in model_registry.info())
+
+# Максимальное количество изображений в одном пакетном запросе
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "16"))
+# Окно и максимальный размер динамического батча для одиночных запросов
+ML_BATCH_WINDOW_MS = float(os.getenv("ML_BATCH_WINDOW_MS", "10"))
+ML_BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "8"))
+
+# Порог уверенности детектора, порог IoU для NMS и ограничение числа номеров на кадре
+PLATE_CONF_THRESHOLD = float(os.getenv("PLATE_CONF_THRESHOLD", "0.25"))
+PLATE_NMS_IOU = float(os.getenv("PLATE_NMS_IOU", "0.5"))
+MAX_PLATES_LIMIT = int(os.getenv("MAX_PLATES_LIMIT", "10"))
+
+# Векторная фильтрация боксов номеров: класс 0, порог уверенности, NMS, сортировка по score
+def plate_boxes(result, conf_threshold=PLATE_CONF_THRESHOLD, iou_threshold=PLATE_NMS_IOU, max_plates=MAX_PLATES_LIMIT):
+    data = result.boxes.data
+    data = data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+    data = data[(data[:, 5] == 0) & (data[:, 4] >= conf_threshold)]
+    if not len(data):
+        return data[:, :5]
+    xywh = np.column_stack((data[:, :2], data[:, 2:4] - data[:, :2]))
+    keep = np.asarray(cv2.dnn.NMSBoxes(xywh, data[:, 4], conf_threshold, iou_threshold), dtype=np.int64).reshape(-1)
+    data = data[keep]
+    return data[np.argsort(-data[:, 4], kind="stable")][:max_plates, :5]
+
+def _to_bboxes(boxes):
+    coords = boxes[:, :4].astype(np.int64).tolist()
+    scores = boxes[:, 4].tolist()
+    return [(x1, y1, x2, y2, score) for (x1, y1, x2, y2), score in zip(coords, scores)]
+
+# Детекция всех номеров на изображении (не более max_plates)
+def detect_license_plates(image, model, max_plates=MAX_PLATES_LIMIT):
+    return detect_license_plates_batch([image], model, [max_plates])[0]
+
+def detect_license_plate_func(image, model):
+    bboxes = detect_license_plates(image, model, max_plates=1)
+    return bboxes[0] if bboxes else None
+
+# Детекция номеров на нескольких изображениях одним вызовом модели
+def detect_license_plates_batch(images, model, max_plates=None):
+    if not images:
+        return []
+    max_plates = max_plates or [MAX_PLATES_LIMIT] * len(images)
+    results = model(list(images))
+    return [_to_bboxes(plate_boxes(result, max_plates=limit)) for result, limit in zip(results, max_plates)]
 
-def detect_license_plate_func(image_path, model):
-    image = cv2.imread(image_path)
-    results = model(image)
-    for result in results:
-        boxes = result.boxes.data.tolist()
-        for box in boxes:
-            x1, y1, x2, y2, score, class_id = box
-            if int(class_id) == 0:
-                return int(x1), int(y1), int(x2), int(y2), score
-    return None
 
 def preprocess_license_plate(image, bbox):
     x1, y1, x2, y2, _ = bbox
@@ -25,51 +82,252 @@ def preprocess_license_plate(image, bbox):
     blurred = cv2.GaussianBlur(thresholded, (3, 3), 0)
     return blurred
 
+# Каскадный OCR: быстрый путь по алфавиту номеров, полный easyocr - только при необходимости
+plate_recognizer = CascadeRecognizer()
+ocr_path_stats = PathStats()
+
 def recognize_text(image):
-    reader = easyocr.Reader(['ru'], gpu=True)
-    results = reader.readtext(image)
-    for detection in results:
-        bbox, text, score = detection
-        text = text.upper().replace(' ', '')
-        return text, score
-    return None, None
+    text, score, _ = plate_recognizer.recognize(image)
+    return text, score
 
-router = APIRouter(prefix="/ml", tags=["ML-модуль"])
+def detection_response(bboxes):
+    if not bboxes:
+        return {"message": "Номерной знак не найден"}
 
-@router.post("/detect-license-plate")
-async def detect_license_plate(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-        temp_file.write(await file.read())
-        temp_file_path = temp_file.name
+    plates = [{"bbox_2d": list(bbox[:4]), "score": bbox[4], "label": "license_plate"} for bbox in bboxes]
+    return {**plates[0], "plates": plates}
 
-    bbox = detect_license_plate_func(temp_file_path, model)
-    if bbox is None:
+def recognition_response(image, bboxes):
+    if not bboxes:
         return {"message": "Номерной знак не найден"}
 
-    x1, y1, x2, y2, score = bbox
+    plates = []
+    for bbox in bboxes:
+        processed_image = preprocess_license_plate(image, bbox)
+        text, score, path = plate_recognizer.recognize(processed_image)
+        plates.append({"bbox_2d": list(bbox[:4]), "score": bbox[4], "license_plate": text, "confidence": score,
+                       "ocr_path": path})
+
+    recognized = [plate for plate in plates if plate["license_plate"] is not None]
+    if not recognized:
+        return {"message": "Текст на номерном знаке не распознан"}
+
+    return {
+        "license_plate": recognized[0]["license_plate"],
+        "confidence": recognized[0]["confidence"],
+        "plates": plates
+    }
+
+# Выполнение задачи инференса над списком изображений (вызывается в процессе пула)
+def run_inference_task(task, images, max_plates=None):
+    bboxes = detect_license_plates_batch(images, get_detector(), max_plates)
+    if task == "detect":
+        return [detection_response(image_bboxes) for image_bboxes in bboxes]
+    return [recognition_response(image, image_bboxes) for image, image_bboxes in zip(images, bboxes)]
+
+# Обработка батча (изображение, max_plates) из планировщика в пуле инференса
+async def _run_batch(task, items):
+    images = [image for image, _ in items]
+    max_plates = [limit for _, limit in items]
+    results = await inference_pool.run(task, images, max_plates)
+    if task == "recognize":
+        _count_ocr_paths(results)
+    return results
+
+# Учет путей каскада OCR по ответам (работает и при инференсе в процессах пула)
+def _count_ocr_paths(results):
+    for result in results:
+        for plate in result.get("plates", []):
+            ocr_path_stats.observe(plate["ocr_path"], plate["license_plate"] is not None)
+
+detector_batcher = MicroBatcher(
+    partial(_run_batch, "detect"),
+    max_batch_size=ML_BATCH_MAX_SIZE,
+    window_ms=ML_BATCH_WINDOW_MS,
+    name="detector",
+    max_in_flight=max(1, inference_pool.workers),
+)
+recognizer_batcher = MicroBatcher(
+    partial(_run_batch, "recognize"),
+    max_batch_size=ML_BATCH_MAX_SIZE,
+    window_ms=ML_BATCH_WINDOW_MS,
+    name="recognizer",
+    max_in_flight=max(1, inference_pool.workers),
+)
+
+def models_info():
+    return model_registry.info()
+
+# Перевод ошибок пула инференса в HTTP-ответы
+async def run_ml(coro):
+    try:
+        return await coro
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
+    except BrokenProcessPool:
+        raise HTTPException(status_code=503, detail="Inference worker crashed, retry the request")
+
+router = APIRouter(prefix="/ml", tags=["ML-модуль"])
+
+# Распознавание номеров на декодированном кадре через кэш и планировщик батчей
+async def recognize_image(image, use_cache=True, max_plates=1):
+    if not use_cache:
+        recognition_cache.bypass()
+        return await run_ml(recognizer_batcher.submit((image, max_plates)))
+
+    frame_hash = dhash(image)
+    version = f"{recognition_version()}|plates={max_plates}"
+    cached = recognition_cache.get(frame_hash, version)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    result = await run_ml(recognizer_batcher.submit((image, max_plates)))
+    # Кэшируются только распознанные номера: пустой кадр может смениться подъехавшей машиной
+    if "license_plate" in result:
+        recognition_cache.put(frame_hash, version, result)
+    return result
+
+def check_max_plates(max_plates):
+    if not 1 <= max_plates <= MAX_PLATES_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_plates must be between 1 and {MAX_PLATES_LIMIT}")
+
+# Асинхронные задания распознавания: payload - (кадр, use_cache, max_plates)
+# В очереди лежат сжатые байты загрузки (не больше MAX_UPLOAD_SIZE), а не декодированный кадр:
+# декодирование - при запуске задания, в потоке, чтобы не блокировать цикл событий
+async def _run_recognition_job(payload):
+    data, use_cache, max_plates = payload
+    image = await run_in_threadpool(decode_upload_image, data)
+    return await recognize_image(image, use_cache, max_plates)
+
+recognition_jobs = JobQueue(_run_recognition_job, name="recognition_jobs")
+# Максимальное время ожидания в long-poll запросе статуса задания (сек)
+ML_JOB_MAX_WAIT = float(os.getenv("ML_JOB_MAX_WAIT", "30"))
+
+def job_response(job):
     return {
-        "bbox_2d": [x1, y1, x2, y2],
-        "score": score,
-        "label": "license_plate"
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "deadline": job["deadline"],
     }
 
+@router.post("/detect-license-plate")
+async def detect_license_plate(file: UploadFile = File(...), max_plates: int = 1):
+    check_max_plates(max_plates)
+    image = await read_upload_image(file)
+    return await run_ml(detector_batcher.submit((image, max_plates)))
+
 @router.post("/recognize-license-plate")
-async def recognize_license_plate(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-        temp_file.write(await file.read())
-        temp_file_path = temp_file.name
+async def recognize_license_plate(file: UploadFile = File(...), use_cache: bool = True, max_plates: int = 1):
+    check_max_plates(max_plates)
+    image = await read_upload_image(file)
+    return await recognize_image(image, use_cache, max_plates)
 
-    bbox = detect_license_plate_func(temp_file_path, model)
-    if bbox is None:
-        return {"message": "Номерной знак не найден"}
+@router.post("/recognize-batch")
+async def recognize_batch(files: List[UploadFile] = File(...), max_plates: int = 1):
+    """
+    Пакетное распознавание: все изображения проходят через модель одним батчем,
+    результаты возвращаются в порядке загрузки файлов.
+    """
+    check_max_plates(max_plates)
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {MAX_BATCH_FILES})")
 
-    image = cv2.imread(temp_file_path)
-    processed_image = preprocess_license_plate(image, bbox)
-    text, score = recognize_text(processed_image)
-    if text is None:
-        return {"message": "Текст на номерном знаке не распознан"}
+    images = [await read_upload_image(file) for file in files]
+    results = await run_ml(inference_pool.run("recognize", images, [max_plates] * len(images)))
+    _count_ocr_paths(results)
+    return {"results": results}
+
+@router.post("/jobs", status_code=202)
+async def submit_recognition_job(file: UploadFile = File(...), use_cache: bool = True, max_plates: int = 1,
+                                 deadline: Optional[float] = None):
+    """
+    Постановка изображения в очередь распознавания: сразу возвращает id задания,
+    результат - через GET /ml/jobs/{job_id}. deadline - время жизни задания в секундах.
+    Изображение декодируется при запуске задания: если файл не изображение, задание завершится со статусом failed.
+    """
+    check_max_plates(max_plates)
+    if deadline is not None and deadline <= 0:
+        raise HTTPException(status_code=400, detail="deadline must be positive")
+    data = await read_upload(file)
+    if not data:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    try:
+        job = recognition_jobs.submit((data, use_cache, max_plates), deadline)
+    except QueueFullError as e:
+        return JSONResponse(status_code=429, content={"detail": str(e)}, headers={"Retry-After": "1"})
+    return job_response(job)
 
+@router.get("/jobs/{job_id}")
+async def get_recognition_job(job_id: str, wait: float = 0):
+    """
+    Статус задания распознавания и результат после завершения.
+    wait - сколько секунд ждать завершения задания перед ответом (long-poll).
+    """
+    if wait < 0:
+        raise HTTPException(status_code=400, detail="wait must be non-negative")
+    job = await recognition_jobs.wait(job_id, min(wait, ML_JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@router.get("/stats")
+async def ml_stats():
+    """
+    Статистика планировщика батчей (глубина очереди, размеры батчей, время ожидания),
+    пула инференса, кэша результатов, путей каскада OCR и очереди заданий.
+    """
     return {
-        "license_plate": text,
-        "confidence": score
-    }
\ No newline at end of file
+        "detector_batcher": detector_batcher.stats(),
+        "recognizer_batcher": recognizer_batcher.stats(),
+        "inference_pool": inference_pool.stats(),
+        "recognition_cache": recognition_cache.stats(),
+        "ocr_paths": ocr_path_stats.snapshot(),
+        "recognition_jobs": recognition_jobs.stats(),
+    }
+
+@router.get("/models")
+async def list_models():
+    """
+    Загруженные модели: пути, версии и занимаемая память.
+    """
+    workers = None
+    if inference_pool.workers > 0:
+        workers = await run_ml(inference_pool.call(models_info))
+    return {"process": models_info(), "inference_worker": workers}
+
+@router.post("/models/{name}/reload")
+async def reload_model(name: str, path: Optional[str] = None, version: Optional[str] = None):
+    """
+    Горячая замена весов модели без перезапуска: запросы в обработке дорабатывают на старых весах.
+    path - файл весов относительно каталога ML_WEIGHTS_DIR; если новые веса не загрузились,
+    продолжают работать старые.
+    """
+    if name not in model_registry.names():
+        raise HTTPException(status_code=404, detail="Model not found")
+    if path is not None:
+        try:
+            path = resolve_weights_path(path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if inference_pool.workers > 0:
+            # Модели живут в процессах пула: новый пул загружает веса в стороне и подменяет старый
+            changes = {name: model_registry.target(name, path, version)}
+            await inference_pool.replace(model_registry.overrides(changes), ML_WARMUP_TIMEOUT)
+            info = model_registry.retarget(name, path, version)
+        else:
+            info = await run_in_threadpool(model_registry.swap, name, path, version)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to load model weights: {e}")
+    recognition_cache.clear()
+    # Новые веса прогреваются заново; до окончания прогрева /health/ready отвечает 503
+    warmup_tracker.reset()
+    asyncio.get_running_loop().create_task(warmup_tracker.run(inference_pool))
+    return {"message": "Model reloaded successfully", "model": info}
\ No newline at end of file
@@ -1,58 +1,67 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.utils.database_utils import (
-    create_resident, get_all_residents, update_resident, delete_resident,
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.utils.async_database_utils import (
+    create_resident, get_residents_page, stream_residents, update_resident, delete_resident,
     create_parking_spot, get_all_parking_spots, update_parking_spot, delete_parking_spot,
-    create_resident_by_name, get_resident_by_tg_id
+    create_resident_by_name, get_resident_by_tg_id, PAGE_SIZE
 )
-from app.db.database import SessionLocal
+from app.db.database import get_db
+from app.utils.streaming import ndjson_response, check_page_limit
+from app.db.schemas import ResidentOut
 
 router = APIRouter(prefix="/parking", tags=["Модуль парковки"])
 
-# Dependency для получения сессии базы данных
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.get("/residents")
-async def view_residents(db: Session = Depends(get_db)):
+async def view_residents(after_id: Optional[int] = None, limit: Optional[int] = None, stream: bool = False,
+                        db: AsyncSession = Depends(get_db)):
     """
-    Просмотр всех жителей.
+    Просмотр жителей. Без параметров - все жители, как раньше.
+    Постранично: after_id - id последнего жителя предыдущей страницы, limit - размер страницы
+    (по умолчанию PAGE_SIZE). stream=true - все жители потоком NDJSON.
     """
-    residents = get_all_residents(db)
-    return {"residents": residents}
+    if stream:
+        return ndjson_response(stream_residents, after_id)
+    if limit is None and after_id is not None:
+        limit = PAGE_SIZE
+    if limit is not None:
+        check_page_limit(limit)
+    residents = await get_residents_page(db, after_id, limit)
+    next_after_id = residents[-1].id if limit is not None and len(residents) == limit else None
+    return {
+        "residents": [ResidentOut.model_validate(resident) for resident in residents],
+        "next_after_id": next_after_id
+    }
 
 @router.post("/residents/register")
-async def register_resident(tg_id: int, name: str, db: Session = Depends(get_db)):
+async def register_resident(tg_id: int, name: str, db: AsyncSession = Depends(get_db)):
     """
     Эндпоинт для регистрации жителя.
     """
-    existing_resident = get_resident_by_tg_id(db, tg_id)
+    existing_resident = await get_resident_by_tg_id(db, tg_id)
     if existing_resident:
         raise HTTPException(status_code=400, detail="Resident with this tg_id already exists")
 
-    new_resident = create_resident_by_name(db, tg_id, name)
+    new_resident = await create_resident_by_name(db, tg_id, name)
     return {"message": "Resident registered successfully", "id": new_resident.id}
 
 @router.put("/residents/{tg_id}")
-async def update_resident_name(tg_id: int, new_name: str, db: Session = Depends(get_db)):
+async def update_resident_name(tg_id: int, new_name: str, db: AsyncSession = Depends(get_db)):
     """
     Обновление имени жителя.
     """
-    resident = update_resident(db, tg_id, new_name)
+    resident = await update_resident(db, tg_id, new_name)
     if not resident:
         raise HTTPException(status_code=404, detail="Resident not found")
-    return {"message": "Resident updated successfully", "resident": resident}
+    return {"message": "Resident updated successfully", "resident": ResidentOut.model_validate(resident)}
 
 @router.delete("/residents/{tg_id}")
-async def remove_resident(tg_id: int, db: Session = Depends(get_db)):
+async def remove_resident(tg_id: int, db: AsyncSession = Depends(get_db)):
     """
     Удаление жителя.
     """
-    resident = delete_resident(db, tg_id)
+    resident = await delete_resident(db, tg_id)
     if not resident:
         raise HTTPException(status_code=404, detail="Resident not found")
     return {"message": "Resident deleted successfully"}
\ No newline at end of file
@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.db.pool_stats import TimedQueuePool, TimedAsyncAdaptedQueuePool, instrument_engine
 import logging
 import os
 
@@ -8,10 +10,66 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/parking_db")
-engine = create_engine(DATABASE_URL)
+
+# Настройки пула соединений (одинаковые для синхронного и асинхронного движка)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+# Пересоздание соединений старше DB_POOL_RECYCLE секунд (-1 - не пересоздавать)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+# Параметры пула для create_engine; SQLite в памяти работает со своим пулом без настроек
+def pool_options(url, poolclass):
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+# URL для асинхронного драйвера: psycopg 3 для Postgres, aiosqlite для SQLite
+def async_database_url(url):
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+psycopg://"),
+        ("postgresql://", "postgresql+psycopg://"),
+        ("sqlite+pysqlite://", "sqlite+aiosqlite://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, TimedAsyncAdaptedQueuePool))
+pool_stats = {
+    "sync": instrument_engine(engine, "sync"),
+    "async": instrument_engine(async_engine, "async"),
+}
+# expire_on_commit=False: после commit объекты отдаются в ответ без повторной загрузки из БД
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+# Dependency для получения асинхронной сессии базы данных (общая для всех роутеров)
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
+    from app.db import models  # noqa: F401 - регистрация таблиц в Base.metadata
+    from app.db.migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     logger.info("Database initialized successfully.")
\ No newline at end of file
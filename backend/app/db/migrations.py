@@ -0,0 +1,128 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+from app.utils.plates import canonical_plate
+
+logger = logging.getLogger(__name__)
+
+
+# Добавление колонки и индекса к существующей таблице (create_all не меняет уже созданные таблицы)
+def add_column(connection, table, column, ddl_type):
+    columns = {c["name"] for c in inspect(connection).get_columns(table)}
+    if column in columns:
+        return False
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    logger.info("Миграция: добавлена колонка %s.%s", table, column)
+    return True
+
+
+def create_index(connection, table, *columns):
+    name = f"ix_{table}_{'_'.join(columns)}"
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+# Уникальный индекс по колонке: существующий неуникальный индекс с тем же именем пересоздается.
+# Дубликаты в данных не дают создать индекс - тогда ошибка пишется в лог, старт приложения не падает
+def create_unique_index(connection, table, column):
+    name = f"ix_{table}_{column}"
+    indexes = {index["name"]: index for index in inspect(connection).get_indexes(table)}
+    if name in indexes and indexes[name]["unique"]:
+        return
+    savepoint = connection.begin_nested()
+    try:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        connection.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({column})"))
+        savepoint.commit()
+        logger.info("Миграция: индекс %s сделан уникальным", name)
+    except Exception:
+        savepoint.rollback()
+        logger.exception("Не удалось создать уникальный индекс %s: в %s есть повторяющиеся значения", name, table)
+
+
+# Заполнение канонического ключа номера для записей, созданных до появления колонки
+def backfill_plate_keys(connection, table):
+    rows = connection.execute(text(f"SELECT id, car_plate FROM {table} WHERE plate_key IS NULL")).fetchall()
+    if rows:
+        connection.execute(
+            text(f"UPDATE {table} SET plate_key = :plate_key WHERE id = :id"),
+            [{"id": row.id, "plate_key": canonical_plate(row.car_plate)} for row in rows]
+        )
+        logger.info("Миграция: заполнен plate_key для %d записей %s", len(rows), table)
+
+
+# Канонический ключ номера; у автомобилей он уникален: А123ВС77 и A123BC77 - один автомобиль
+def migrate_plate_keys(connection):
+    for table in ("cars", "bookings"):
+        add_column(connection, table, "plate_key", "VARCHAR")
+        backfill_plate_keys(connection, table)
+    create_unique_index(connection, "cars", "plate_key")
+    create_index(connection, "bookings", "plate_key")
+
+
+# Интервалы бронирований: индекс для поиска пересечений по месту, а в Postgres -
+# колонка period tsrange и ограничение-исключение, запрещающее пересекающиеся брони одного места.
+# tsrange, а не tstzrange: start_time/end_time хранятся без часового пояса, а приведение к timestamptz
+# зависит от настроек сессии и не может использоваться в генерируемой колонке
+def migrate_booking_periods(connection):
+    create_index(connection, "bookings", "spot_id", "start_time", "end_time")
+    if connection.dialect.name != "postgresql":
+        return
+
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    add_column(connection, "bookings", "period",
+               "tsrange GENERATED ALWAYS AS (tsrange(start_time, end_time, '[)')) STORED")
+    exists = connection.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = 'bookings_spot_period_excl'")
+    ).first()
+    if exists:
+        return
+    # Уже пересекающиеся брони не дадут создать ограничение: миграция не должна ронять старт приложения
+    savepoint = connection.begin_nested()
+    try:
+        connection.execute(text(
+            "ALTER TABLE bookings ADD CONSTRAINT bookings_spot_period_excl "
+            "EXCLUDE USING gist (spot_id WITH =, period WITH &&)"
+        ))
+        savepoint.commit()
+        logger.info("Миграция: добавлено ограничение bookings_spot_period_excl")
+    except Exception:
+        savepoint.rollback()
+        logger.exception("Не удалось добавить ограничение на пересечение броней: есть пересекающиеся бронирования")
+
+
+# Триггеры журнала booking_changes: каждая вставка, изменение и удаление брони оставляет строку с временем
+# по часам БД. Время записи, а не фиксации: транзакции фиксируются не по порядку, поэтому читатели журнала
+# перечитывают его с запасом (BOOKING_CHANGES_LOOKBACK_SECONDS)
+def migrate_booking_changes(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "CREATE OR REPLACE FUNCTION log_booking_change() RETURNS trigger AS $$ "
+            "BEGIN "
+            "INSERT INTO booking_changes (booking_id, changed_at) "
+            "VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END, clock_timestamp()::timestamp); "
+            "RETURN NULL; "
+            "END $$ LANGUAGE plpgsql"
+        ))
+        connection.execute(text("DROP TRIGGER IF EXISTS bookings_log_change ON bookings"))
+        connection.execute(text(
+            "CREATE TRIGGER bookings_log_change AFTER INSERT OR UPDATE OR DELETE ON bookings "
+            "FOR EACH ROW EXECUTE PROCEDURE log_booking_change()"
+        ))
+        return
+
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS bookings_log_{event.lower()} AFTER {event} ON bookings "
+            f"BEGIN INSERT INTO booking_changes (booking_id, changed_at) "
+            f"VALUES ({row}.id, strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')); END"
+        ))
+
+
+MIGRATIONS = [migrate_plate_keys, migrate_booking_periods, migrate_booking_changes]
+
+
+def run_migrations(engine):
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            migration(connection)
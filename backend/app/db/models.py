@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
+from app.utils.plates import canonical_plate
 from .database import Base
 
 class Resident(Base):
@@ -14,14 +15,21 @@ class Car(Base):
     __tablename__ = "cars"
     id = Column(Integer, primary_key=True, index=True)
     car_plate = Column(String, unique=True, index=True, nullable=False)
+    plate_key = Column(String, unique=True, index=True)
     owner_id = Column(Integer, ForeignKey("residents.id"), nullable=False)
     owner = relationship("Resident", back_populates="cars")
 
+    @validates("car_plate")
+    def _set_plate_key(self, key, value):
+        self.plate_key = canonical_plate(value)
+        return value
+
 class ParkingSpot(Base):
     __tablename__ = "parking_spots"
     id = Column(Integer, primary_key=True, index=True)
     parking_spot_number = Column(String, unique=True, index=True, nullable=False)
     description = Column(String, index=True)
+    # Не используется для доступности: занятость определяется интервалами бронирований
     is_reserved = Column(Boolean, default=False)
     bookings = relationship("Booking", back_populates="spot")
 
@@ -31,11 +39,25 @@ class Booking(Base):
     resident_id = Column(Integer, ForeignKey("residents.id"), nullable=False)
     spot_id = Column(Integer, ForeignKey("parking_spots.id"), nullable=False)
     car_plate = Column(String, ForeignKey("cars.car_plate"), nullable=False)
+    plate_key = Column(String, index=True)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
     resident = relationship("Resident", back_populates="bookings")
     spot = relationship("ParkingSpot", back_populates="bookings")
 
+    @validates("car_plate")
+    def _set_plate_key(self, key, value):
+        self.plate_key = canonical_plate(value)
+        return value
+
+# Журнал изменений бронирований: строки пишут триггеры БД (migrate_booking_changes) при вставке,
+# изменении и удалении, в том числе из других процессов. По нему индексы в памяти находят изменения
+class BookingChange(Base):
+    __tablename__ = "booking_changes"
+    id = Column(Integer, primary_key=True)
+    booking_id = Column(Integer, nullable=False)
+    changed_at = Column(DateTime, nullable=False, index=True)
+
 class Log(Base):
     __tablename__ = "logs"
     id = Column(Integer, primary_key=True, index=True)
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.batching import Histogram
+
+
+class PoolStats:
+    """
+    Статистика пула соединений: время ожидания выдачи соединения,
+    таймауты выдачи и оборот соединений (создание, закрытие, инвалидация).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self.wait_ms_hist = Histogram([0.1, 1, 5, 10, 50, 100, 500, 1000, 5000])
+        self.counters = {
+            "checkouts": 0, "checkins": 0, "checkout_timeouts": 0,
+            "connects": 0, "closes": 0, "invalidations": 0, "soft_invalidations": 0,
+        }
+        self._lock = threading.Lock()
+
+    def incr(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def snapshot(self):
+        pool = self.pool
+        with self._lock:
+            counters = dict(self.counters)
+        state = {}
+        if isinstance(pool, QueuePool):
+            state = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout_s": pool.timeout(),
+            }
+        return {
+            "name": self.name,
+            "pool_class": type(pool).__name__ if pool is not None else None,
+            **state,
+            **counters,
+            "checkout_wait_ms": self.wait_ms_hist.snapshot(),
+        }
+
+
+class _TimedCheckout:
+    """
+    Примесь к пулу SQLAlchemy: замеряет время ожидания свободного соединения.
+    События пула сообщают о выдаче соединения, но не о том, сколько запрос ждал в очереди.
+    """
+
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.stats is not None:
+                self.stats.incr("checkout_timeouts")
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.wait_ms_hist.observe((time.perf_counter() - start) * 1000.0)
+
+    # engine.dispose() пересоздает пул: статистика переходит к новому экземпляру
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        if self.stats is not None:
+            self.stats.pool = pool
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# Подключение статистики к движку (синхронному или асинхронному) через события пула
+def instrument_engine(engine, name):
+    engine = getattr(engine, "sync_engine", engine)
+    stats = PoolStats(name)
+    stats.pool = engine.pool
+    engine.pool.stats = stats
+
+    event.listen(engine, "connect", lambda *args: stats.incr("connects"))
+    event.listen(engine, "close", lambda *args: stats.incr("closes"))
+    event.listen(engine, "invalidate", lambda *args: stats.incr("invalidations"))
+    event.listen(engine, "soft_invalidate", lambda *args: stats.incr("soft_invalidations"))
+    event.listen(engine, "checkout", lambda *args: stats.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats.incr("checkins"))
+    return stats
@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """
+    SQL-запросы, выполненные движком за время контекста count_queries.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+# Подсчет запросов движка (синхронного или асинхронного); max_count - допустимый максимум
+@contextmanager
+def count_queries(engine, max_count=None):
+    engine = getattr(engine, "sync_engine", engine)
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._before_cursor_execute)
+    if max_count is not None and counter.count > max_count:
+        raise AssertionError(
+            f"Expected at most {max_count} SQL statements, got {counter.count}:\n" + "\n".join(counter.statements)
+        )
@@ -0,0 +1,28 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+# Модели ответов: строятся из строк запросов-проекций или ORM-объектов (from_attributes)
+class ResidentOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: Optional[str] = None
+    tg_id: int
+
+
+class CarOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    car_plate: str
+    owner_id: int
+
+
+class SpotOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    parking_spot_number: str
+    description: Optional[str] = None
@@ -1,9 +1,15 @@
 from fastapi import FastAPI
-from ultralytics import YOLO
-from app.db.database import init_db
-from app.controllers.ml_controller import router as ml_router
-from app.controllers.booking_controller import router as booking_router
+import asyncio
+from app.db.database import init_db, async_engine
+from app.utils.inference_pool import inference_pool
+from app.utils.warmup import warmup_tracker
+from app.controllers.ml_controller import router as ml_router, recognition_jobs
+from app.controllers.booking_controller import (
+    router as booking_router, refresh_availability_index, availability_index_refresher
+)
 from app.controllers.parking_controller import router as parking_router
+from app.controllers.health_controller import router as health_router
+from app.controllers.gate_controller import router as gate_router, refresh_plate_index, plate_index_refresher
 
 app = FastAPI(
     title="Система распознавания автомобильных номеров",
@@ -14,13 +20,35 @@ app = FastAPI(
 @app.on_event("startup")
 def on_startup():
     init_db()
-    global model
-    model = YOLO('best.pt')
+    refresh_plate_index()
+    refresh_availability_index()
+    if inference_pool.workers > 0:
+        inference_pool.start()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.plate_index_task = asyncio.create_task(plate_index_refresher())
+    app.state.availability_task = asyncio.create_task(availability_index_refresher())
+    # Прогрев моделей в фоне: /health/live отвечает сразу, /health/ready - после прогрева
+    app.state.warmup_task = asyncio.create_task(warmup_tracker.run(inference_pool))
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.plate_index_task.cancel()
+    app.state.availability_task.cancel()
+    app.state.warmup_task.cancel()
+    await recognition_jobs.close()
+    inference_pool.shutdown()
+    await async_engine.dispose()
 
 
 app.include_router(ml_router)
 app.include_router(booking_router)
 app.include_router(parking_router)
+app.include_router(gate_router)
+app.include_router(health_router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,326 @@
+from sqlalchemy import select, insert, delete, exists, literal, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.db.models import Resident, Car, ParkingSpot, Booking
+from app.utils.plate_index import active_plate_index, registered_plate_index
+from app.utils.availability_index import availability_index
+from app.utils.plates import canonical_plate
+from datetime import datetime
+import asyncio
+import os
+import random
+import weakref
+
+# Асинхронные версии функций database_utils для обработчиков FastAPI:
+# запросы к БД не блокируют цикл событий
+
+# Размер страницы по умолчанию, максимальный размер страницы и размер порции чтения при потоковой выдаче
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
+
+# Сколько ждать блокировки места, занятой другой бронью (мс), число повторов после таймаута
+# и базовая пауза между повторами (сек)
+RESERVATION_LOCK_TIMEOUT_MS = int(os.getenv("RESERVATION_LOCK_TIMEOUT_MS", "2000"))
+RESERVATION_RETRIES = int(os.getenv("RESERVATION_RETRIES", "2"))
+RESERVATION_RETRY_DELAY = float(os.getenv("RESERVATION_RETRY_DELAY", "0.05"))
+
+# SQLSTATE lock_not_available: истек lock_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+
+RESIDENT_COLUMNS = (Resident.id, Resident.name, Resident.tg_id)
+SPOT_COLUMNS = (ParkingSpot.id, ParkingSpot.parking_spot_number, ParkingSpot.description)
+
+
+class SpotUnavailableError(Exception):
+    pass
+
+
+class SpotBusyError(Exception):
+    pass
+
+
+class PlateTakenError(Exception):
+    pass
+
+
+# Блокировки мест в процессе для SQLite (там нет SELECT ... FOR UPDATE); освобождаются вместе с последним ожидающим
+_spot_locks = weakref.WeakValueDictionary()
+
+
+def _spot_lock(spot_id):
+    lock = _spot_locks.get(spot_id)
+    if lock is None:
+        lock = _spot_locks[spot_id] = asyncio.Lock()
+    return lock
+
+
+# Условие "у места есть бронирование, пересекающееся с окном [start_time, end_time)"
+def spot_is_booked(spot_id_column, start_time, end_time):
+    return exists().where(
+        Booking.spot_id == spot_id_column, Booking.start_time < end_time, Booking.end_time > start_time
+    )
+
+
+# Keyset-пагинация: строки с id больше after_id по возрастанию id
+def _keyset(query, id_column, after_id=None, limit=None):
+    query = query.order_by(id_column)
+    if after_id is not None:
+        query = query.where(id_column > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+# Потоковое чтение порциями по chunk_size строк: в памяти не держится весь результат
+async def _stream_rows(db: AsyncSession, query, chunk_size=STREAM_CHUNK_SIZE):
+    result = await db.stream(query.execution_options(yield_per=chunk_size))
+    async for row in result.mappings():
+        yield dict(row)
+
+# Создание записи в таблице Residents
+async def create_resident(db: AsyncSession, tg_id: int):
+    resident = Resident(tg_id=tg_id)
+    db.add(resident)
+    await db.commit()
+    return resident
+
+# Создание жителя с именем
+async def create_resident_by_name(db: AsyncSession, tg_id: int, name: str):
+    resident = Resident(tg_id=tg_id, name=name)
+    db.add(resident)
+    await db.commit()
+    return resident
+
+# Получение всех жителей
+async def get_all_residents(db: AsyncSession):
+    result = await db.execute(select(Resident))
+    return result.scalars().all()
+
+# Страница жителей (строки id, name, tg_id) после after_id
+async def get_residents_page(db: AsyncSession, after_id: int = None, limit: int = PAGE_SIZE):
+    result = await db.execute(_keyset(select(*RESIDENT_COLUMNS), Resident.id, after_id, limit))
+    return result.all()
+
+# Все жители после after_id потоком словарей
+def stream_residents(db: AsyncSession, after_id: int = None):
+    return _stream_rows(db, _keyset(select(*RESIDENT_COLUMNS), Resident.id, after_id))
+
+# Обновление имени жителя
+async def update_resident(db: AsyncSession, tg_id: int, new_name: str):
+    resident = await get_resident_by_tg_id(db, tg_id)
+    if resident:
+        resident.name = new_name
+        await db.commit()
+    return resident
+
+# Удаление жителя (связанные записи загружаются заранее: при удалении ORM обрабатывает связи,
+# а ленивая загрузка в асинхронной сессии недоступна)
+async def delete_resident(db: AsyncSession, tg_id: int):
+    result = await db.execute(
+        select(Resident).options(selectinload(Resident.cars), selectinload(Resident.bookings))
+        .where(Resident.tg_id == tg_id)
+    )
+    resident = result.scalars().first()
+    if resident:
+        await db.delete(resident)
+        await db.commit()
+        for car in resident.cars:
+            registered_plate_index.remove(car.plate_key)
+    return resident
+
+# Создание парковочного места
+async def create_parking_spot(db: AsyncSession, parking_spot_number: str, description: str):
+    spot = ParkingSpot(parking_spot_number=parking_spot_number, description=description, is_reserved=False)
+    db.add(spot)
+    await db.commit()
+    availability_index.add_spot(spot)
+    return spot
+
+# Получение всех парковочных мест
+async def get_all_parking_spots(db: AsyncSession):
+    result = await db.execute(select(ParkingSpot))
+    return result.scalars().all()
+
+# Получение парковочного места по id
+async def get_parking_spot(db: AsyncSession, spot_id: int):
+    return await db.get(ParkingSpot, spot_id)
+
+# Обновление описания парковочного места
+async def update_parking_spot(db: AsyncSession, spot_id: int, new_description: str):
+    spot = await get_parking_spot(db, spot_id)
+    if spot:
+        spot.description = new_description
+        await db.commit()
+        availability_index.add_spot(spot)
+    return spot
+
+# Удаление парковочного места
+async def delete_parking_spot(db: AsyncSession, spot_id: int):
+    spot = await db.get(ParkingSpot, spot_id, options=[selectinload(ParkingSpot.bookings)])
+    if spot:
+        await db.delete(spot)
+        await db.commit()
+        availability_index.remove_spot(spot_id)
+    return spot
+
+# Получение жителя по tg_id
+async def get_resident_by_tg_id(db: AsyncSession, tg_id: int):
+    result = await db.execute(select(Resident).where(Resident.tg_id == tg_id))
+    return result.scalars().first()
+
+# Создание записи в таблице Cars
+# Номер с тем же каноническим ключом уже зарегистрирован (в том числе параллельным запросом) - PlateTakenError
+async def create_car(db: AsyncSession, resident_id: int, car_plate: str):
+    car = Car(car_plate=car_plate, owner_id=resident_id)
+    db.add(car)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise PlateTakenError(f"Car plate {car_plate} is already registered") from e
+    registered_plate_index.add(car.plate_key, car.car_plate)
+    return car
+
+# Получение автомобиля по car_plate и owner_id (сравнение по каноническому ключу номера)
+async def get_car_by_plate_and_owner(db: AsyncSession, car_plate: str, owner_id: int):
+    result = await db.execute(
+        select(Car).where(Car.plate_key == canonical_plate(car_plate), Car.owner_id == owner_id)
+    )
+    return result.scalars().first()
+
+# Получение автомобиля по каноническому ключу номера среди всех владельцев
+async def get_car_by_plate(db: AsyncSession, car_plate: str):
+    result = await db.execute(select(Car).where(Car.plate_key == canonical_plate(car_plate)))
+    return result.scalars().first()
+
+# Получение всех автомобилей (строки id, car_plate, owner_id) для жителя по tg_id одним запросом
+async def get_cars_by_tg_id(db: AsyncSession, tg_id: int):
+    result = await db.execute(
+        select(Car.id, Car.car_plate, Car.owner_id).join(Resident, Car.owner_id == Resident.id)
+        .where(Resident.tg_id == tg_id).order_by(Car.id)
+    )
+    return result.all()
+
+# Получение свободных парковочных мест (строки id, номер, описание); limit=None - все после after_id
+async def get_free_parking_spots(db: AsyncSession, start_time: datetime, end_time: datetime, after_id: int = None,
+                                 limit: int = None):
+    query = select(*SPOT_COLUMNS).where(~spot_is_booked(ParkingSpot.id, start_time, end_time))
+    result = await db.execute(_keyset(query, ParkingSpot.id, after_id, limit))
+    return result.all()
+
+# Свободные в окне парковочные места после after_id потоком словарей
+def stream_free_parking_spots(db: AsyncSession, start_time: datetime, end_time: datetime, after_id: int = None):
+    query = select(*SPOT_COLUMNS).where(~spot_is_booked(ParkingSpot.id, start_time, end_time))
+    return _stream_rows(db, _keyset(query, ParkingSpot.id, after_id))
+
+# Вставка брони, если у места нет пересекающихся бронирований: проверка и запись - один запрос
+def _insert_booking_if_free(booking: Booking):
+    columns = (Booking.resident_id, Booking.spot_id, Booking.car_plate, Booking.plate_key,
+               Booking.start_time, Booking.end_time)
+    values = select(*(literal(getattr(booking, column.key), column.type) for column in columns)).where(
+        ~spot_is_booked(booking.spot_id, booking.start_time, booking.end_time)
+    )
+    return insert(Booking).from_select([column.key for column in columns], values).returning(Booking.id)
+
+
+# Одна попытка бронирования в транзакции. Postgres: брони одного места выстраиваются в очередь
+# на блокировке строки места (SELECT ... FOR UPDATE, не дольше RESERVATION_LOCK_TIMEOUT_MS),
+# пересечения проверяются уже под блокировкой. Блокировку не дождались - SpotBusyError
+async def _try_insert_booking(db: AsyncSession, booking: Booking):
+    if db.bind.dialect.name != "sqlite":
+        await db.execute(text(f"SET LOCAL lock_timeout = {RESERVATION_LOCK_TIMEOUT_MS}"))
+        try:
+            await db.execute(
+                select(ParkingSpot.id).where(ParkingSpot.id == booking.spot_id).with_for_update()
+            )
+        except OperationalError as e:
+            await db.rollback()
+            if getattr(e.orig, "sqlstate", None) == LOCK_NOT_AVAILABLE:
+                raise SpotBusyError(f"Spot {booking.spot_id} is being reserved") from e
+            raise
+    try:
+        booking_id = (await db.execute(_insert_booking_if_free(booking))).scalar()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # Ограничение bookings_spot_period_excl - последняя защита от пересечений в Postgres
+        if "bookings_spot_period_excl" in str(e.orig):
+            raise SpotUnavailableError(f"Spot {booking.spot_id} is already booked for this period") from e
+        raise
+    if booking_id is None:
+        raise SpotUnavailableError(f"Spot {booking.spot_id} is already booked for this period")
+    return booking_id
+
+
+# Создание бронирования с ограниченным числом повторов, если блокировку места не дождались.
+# SpotUnavailableError - место занято в этом окне, SpotBusyError - блокировку места не удалось получить
+async def create_booking(db: AsyncSession, resident_id: int, spot_id: int, car_plate: str, start_time: datetime,
+                         end_time: datetime):
+    booking = Booking(
+        resident_id=resident_id,
+        spot_id=spot_id,
+        car_plate=car_plate,
+        start_time=start_time,
+        end_time=end_time
+    )
+    for attempt in range(RESERVATION_RETRIES + 1):
+        try:
+            if db.bind.dialect.name == "sqlite":
+                async with _spot_lock(spot_id):
+                    booking.id = await _try_insert_booking(db, booking)
+            else:
+                booking.id = await _try_insert_booking(db, booking)
+            break
+        except SpotBusyError:
+            if attempt == RESERVATION_RETRIES:
+                raise
+            # Экспоненциальная пауза со случайным разбросом, чтобы повторы не совпадали
+            await asyncio.sleep(RESERVATION_RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5))
+    active_plate_index.add(booking)
+    availability_index.add(booking)
+    return booking
+
+# Отмена бронирования: удаление с RETURNING вместо предварительной загрузки брони
+async def cancel_booking(db: AsyncSession, booking_id: int):
+    result = await db.execute(
+        delete(Booking).where(Booking.id == booking_id).returning(Booking.id, Booking.spot_id)
+    )
+    booking = result.first()
+    if booking:
+        await db.commit()
+        active_plate_index.remove(booking_id)
+        availability_index.remove(booking_id)
+    return booking
+
+# Получение всех бронирований для жителя
+async def get_resident_bookings(db: AsyncSession, resident_id: int):
+    result = await db.execute(select(Booking).where(Booking.resident_id == resident_id))
+    return result.scalars().all()
+
+# Бронирования жителя по tg_id одним запросом: строки (resident_id, id, spot_id, car_plate, start_time, end_time).
+# Пустой список - жителя нет; у жителя без бронирований одна строка с id = None
+async def get_bookings_by_tg_id(db: AsyncSession, tg_id: int):
+    result = await db.execute(
+        select(Resident.id.label("resident_id"), Booking.id, Booking.spot_id, Booking.car_plate,
+               Booking.start_time, Booking.end_time)
+        .outerjoin(Booking, Booking.resident_id == Resident.id)
+        .where(Resident.tg_id == tg_id).order_by(Booking.id)
+    )
+    return result.all()
+
+# Все данные для бронирования одним запросом: житель, его автомобиль с номером car_plate,
+# парковочное место и занято ли оно в окне [start_time, end_time).
+# None - жителя нет; car_plate/spot_id = None - нет автомобиля/места
+async def get_reservation_context(db: AsyncSession, tg_id: int, car_plate: str, spot_id: int, start_time: datetime,
+                                  end_time: datetime):
+    result = await db.execute(
+        select(Resident.id.label("resident_id"), Car.car_plate, ParkingSpot.id.label("spot_id"),
+               spot_is_booked(ParkingSpot.id, start_time, end_time).label("is_booked"))
+        .outerjoin(Car, (Car.owner_id == Resident.id) & (Car.plate_key == canonical_plate(car_plate)))
+        .outerjoin(ParkingSpot, ParkingSpot.id == spot_id)
+        .where(Resident.tg_id == tg_id)
+        .limit(1)
+    )
+    return result.first()
@@ -0,0 +1,231 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from app.db.models import Booking, ParkingSpot
+from app.utils.booking_changes import changes_watermark, changed_bookings
+
+logger = logging.getLogger(__name__)
+
+# Период инкрементального обновления индекса и полной перезагрузки (сек)
+AVAILABILITY_REFRESH_SECONDS = float(os.getenv("AVAILABILITY_REFRESH_SECONDS", "5"))
+AVAILABILITY_FULL_RELOAD_SECONDS = float(os.getenv("AVAILABILITY_FULL_RELOAD_SECONDS", "300"))
+
+SpotRow = namedtuple("SpotRow", ["id", "parking_spot_number", "description"])
+
+
+class SpotIntervals:
+    """
+    Интервалы [start, end) бронирований одного места, отсортированные по началу.
+    Интервалы могут пересекаться (устаревшие строки, брони до ограничения-исключения), поэтому
+    проверка окна не опирается на порядок концов: пересечь окно могут только интервалы, начавшиеся
+    не раньше start - max_length, где max_length - самая длинная бронь места.
+    """
+
+    __slots__ = ("starts", "ends", "ids", "max_length")
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.max_length = 0.0
+
+    def is_free(self, start, end):
+        lo = bisect.bisect_left(self.starts, start - self.max_length)
+        hi = bisect.bisect_left(self.starts, end)
+        return all(self.ends[i] <= start for i in range(lo, hi))
+
+    def add(self, booking_id, start, end):
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, booking_id)
+        self.max_length = max(self.max_length, end - start)
+
+    def remove(self, booking_id, start):
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ids[i] == booking_id:
+                del self.starts[i], self.ends[i], self.ids[i]
+                return
+            i += 1
+
+    # Удаление интервалов, начавшихся раньше now - max_length: все они закончились до now
+    def prune(self, now):
+        i = bisect.bisect_left(self.starts, now - self.max_length)
+        expired = self.ids[:i]
+        del self.starts[:i], self.ends[:i], self.ids[:i]
+        return expired
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class AvailabilityIndex:
+    """
+    Индекс занятости парковочных мест по интервалам бронирований в памяти процесса:
+    свободные места в окне [start, end) - O(log n) на место (плюс брони, начавшиеся незадолго до окна).
+    Обновляется при создании/отмене брони и места, по журналу booking_changes (изменения из других
+    процессов) и периодической полной перезагрузкой. Места перечитываются целиком: их немного.
+    Как и в ActivePlateIndex, локальные изменения во время чтения из БД не теряются и не отменяются
+    устаревшими строками. Источник истины - БД: бронирование проверяет пересечения там.
+    """
+
+    def __init__(self):
+        self._spots = {}
+        self._spot_ids = []
+        self._intervals = {}
+        self._bookings = {}
+        # Брони и места, удаленные и созданные в этом процессе после начала последнего чтения из БД
+        self._removed, self._added = set(), {}
+        self._removed_spots, self._added_spots = set(), {}
+        self._watermark = None
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.last_refresh = None
+        self.last_full_reload = None
+
+    def _add_spot(self, spot_id, number, description):
+        if spot_id not in self._spots:
+            bisect.insort(self._spot_ids, spot_id)
+        self._spots[spot_id] = SpotRow(spot_id, number, description)
+
+    def _remove_spot(self, spot_id):
+        if self._spots.pop(spot_id, None) is not None:
+            self._spot_ids.pop(bisect.bisect_left(self._spot_ids, spot_id))
+
+    def _add_booking(self, booking_id, spot_id, start_time, end_time):
+        self._remove_booking(booking_id)
+        start, end = start_time.timestamp(), end_time.timestamp()
+        self._intervals.setdefault(spot_id, SpotIntervals()).add(booking_id, start, end)
+        self._bookings[booking_id] = (spot_id, start)
+
+    def _remove_booking(self, booking_id):
+        found = self._bookings.pop(booking_id, None)
+        if found is not None:
+            spot_id, start = found
+            self._intervals[spot_id].remove(booking_id, start)
+
+    def add_spot(self, spot):
+        row = (spot.id, spot.parking_spot_number, spot.description)
+        with self._lock:
+            self._removed_spots.discard(spot.id)
+            self._added_spots[spot.id] = row
+            self._add_spot(*row)
+
+    def remove_spot(self, spot_id):
+        with self._lock:
+            self._removed_spots.add(spot_id)
+            self._added_spots.pop(spot_id, None)
+            self._remove_spot(spot_id)
+
+    def add(self, booking):
+        row = (booking.id, booking.spot_id, booking.start_time, booking.end_time)
+        with self._lock:
+            self._added[booking.id] = row
+            self._add_booking(*row)
+
+    def remove(self, booking_id):
+        with self._lock:
+            self._removed.add(booking_id)
+            self._added.pop(booking_id, None)
+            self._remove_booking(booking_id)
+
+    # Начало чтения из БД: с этого момента локальные изменения запоминаются заново
+    def _begin_read(self):
+        with self._lock:
+            self._removed, self._added = set(), {}
+            self._removed_spots, self._added_spots = set(), {}
+
+    def _spot_rows(self, db):
+        return db.query(ParkingSpot.id, ParkingSpot.parking_spot_number, ParkingSpot.description).all()
+
+    def _booking_rows(self, db):
+        return db.query(Booking.id, Booking.spot_id, Booking.start_time, Booking.end_time).filter(
+            Booking.end_time >= datetime.now()
+        ).all()
+
+    # Места из БД с учетом мест, созданных и удаленных в этом процессе во время чтения
+    def _replace_spots(self, rows):
+        self._spots, self._spot_ids = {}, []
+        for row in rows:
+            if row.id not in self._removed_spots:
+                self._add_spot(*row)
+        for row in self._added_spots.values():
+            self._add_spot(*row)
+
+    # Полная перезагрузка индекса из БД
+    def reload(self, db):
+        self._begin_read()
+        watermark = changes_watermark(db)
+        spots, bookings = self._spot_rows(db), self._booking_rows(db)
+        with self._lock:
+            self._replace_spots(spots)
+            self._intervals, self._bookings = {}, {}
+            for row in bookings:
+                if row.id not in self._removed:
+                    self._add_booking(*row)
+            for row in self._added.values():
+                self._add_booking(*row)
+            self._watermark = watermark
+            self.loaded = True
+            self.last_refresh = self.last_full_reload = time.time()
+        logger.info("Индекс занятости мест загружен: %d мест, %d бронирований", len(spots), len(bookings))
+
+    # Инкрементальное обновление: все места и брони, изменившиеся по журналу booking_changes
+    def refresh(self, db):
+        if not self.loaded or time.time() - self.last_full_reload >= AVAILABILITY_FULL_RELOAD_SECONDS:
+            return self.reload(db)
+        self._begin_read()
+        watermark = changes_watermark(db)
+        spots = self._spot_rows(db)
+        changes = changed_bookings(db, self._watermark, Booking.spot_id, Booking.start_time, Booking.end_time)
+        with self._lock:
+            self._replace_spots(spots)
+            for booking_id, spot_id, start_time, end_time in changes:
+                if spot_id is None or booking_id in self._removed:
+                    self._remove_booking(booking_id)
+                elif booking_id not in self._added:
+                    self._add_booking(booking_id, spot_id, start_time, end_time)
+            now = time.time()
+            for intervals in self._intervals.values():
+                for booking_id in intervals.prune(now):
+                    self._bookings.pop(booking_id, None)
+            self._watermark = watermark or self._watermark
+            self.last_refresh = now
+
+    # Свободные в окне [start_time, end_time) места после after_id по возрастанию id
+    def free_spots(self, start_time, end_time, after_id=None, limit=None):
+        start, end = start_time.timestamp(), end_time.timestamp()
+        free = []
+        with self._lock:
+            i = bisect.bisect_right(self._spot_ids, after_id) if after_id is not None else 0
+            for spot_id in self._spot_ids[i:]:
+                intervals = self._intervals.get(spot_id)
+                if intervals is None or intervals.is_free(start, end):
+                    free.append(self._spots[spot_id])
+                    if limit is not None and len(free) >= limit:
+                        break
+        return free
+
+    def is_free(self, spot_id, start_time, end_time):
+        with self._lock:
+            intervals = self._intervals.get(spot_id)
+            return intervals is None or intervals.is_free(start_time.timestamp(), end_time.timestamp())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "spots": len(self._spots),
+                "bookings": len(self._bookings),
+                "last_refresh": self.last_refresh,
+                "last_full_reload": self.last_full_reload,
+            }
+
+
+availability_index = AvailabilityIndex()
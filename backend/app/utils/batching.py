@@ -0,0 +1,150 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Простая гистограмма с фиксированными границами корзин.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "mean": self.total / self.count if self.count else 0.0,
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class MicroBatcher:
+    """
+    Собирает одиночные запросы, пришедшие в течение окна window_ms (не более max_batch_size),
+    и обрабатывает их одним вызовом process_batch(items) -> list результатов.
+    Каждый вызывающий получает свой результат через submit().
+    process_batch может быть корутиной; одновременно выполняется не более max_in_flight батчей.
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, window_ms=10.0, name="batcher", max_in_flight=1):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.name = name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms_hist = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 1000])
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._slots = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.wait_ms_hist.observe((started - enqueued) * 1000.0)
+            self.batch_size_hist.observe(len(batch))
+            self.batches += 1
+            self.items += len(batch)
+
+            await self._slots.acquire()
+            asyncio.get_running_loop().create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        items = [item for item, _, _ in batch]
+        try:
+            if asyncio.iscoroutinefunction(self.process_batch):
+                results = await self.process_batch(items)
+            else:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self._executor, self.process_batch, items)
+        except Exception as e:
+            logger.warning("Ошибка обработки батча %s: %r", self.name, e)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000.0,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "batch_size": self.batch_size_hist.snapshot(),
+            "wait_ms": self.wait_ms_hist.snapshot(),
+        }
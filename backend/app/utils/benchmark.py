@@ -0,0 +1,248 @@
+"""
+Бенчмарк пайплайна распознавания по стадиям: decode, detect, preprocess, ocr, serialize.
+Работает на папке с изображениями и/или на сгенерированных синтетических номерах.
+При concurrency > 1 запросы выполняют отдельные процессы со своими моделями, как в пуле инференса:
+предиктор ultralytics не потокобезопасен, общий экземпляр в потоках искажает и результаты, и время.
+
+Примеры:
+    python -m app.utils.benchmark --synthetic 64 --concurrency 1,4 --batch-size 1,8
+    python -m app.utils.benchmark --images ./samples --output bench.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.utils.image_utils import decode_image
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("decode", "detect", "preprocess", "ocr", "serialize")
+# Шрифты Hershey в OpenCV не содержат кириллицы: используются латинские двойники букв номера
+SYNTHETIC_LETTERS = "ABEKMHOPCTYX"
+
+
+# Синтетический кадр с номером: (jpeg-байты, bbox номера)
+def synthetic_plate_image(rng, width=640, height=480):
+    image = rng.integers(60, 140, size=(height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (7, 7), 0)
+    text = (rng.choice(list(SYNTHETIC_LETTERS)) + "".join(rng.choice(list("0123456789"), 3))
+            + "".join(rng.choice(list(SYNTHETIC_LETTERS), 2)) + "".join(rng.choice(list("0123456789"), 2)))
+
+    plate_w = int(rng.integers(180, 260))
+    plate_h = plate_w // 4
+    x1 = int(rng.integers(0, width - plate_w))
+    y1 = int(rng.integers(height // 2, height - plate_h))
+    x2, y2 = x1 + plate_w, y1 + plate_h
+    cv2.rectangle(image, (x1, y1), (x2, y2), (235, 235, 235), -1)
+    cv2.rectangle(image, (x1, y1), (x2, y2), (20, 20, 20), 2)
+    scale = plate_h / 40.0
+    cv2.putText(image, text, (x1 + 8, y2 - plate_h // 4), cv2.FONT_HERSHEY_SIMPLEX, scale, (15, 15, 15), 2, cv2.LINE_AA)
+
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes(), (x1, y1, x2, y2, 1.0)
+
+
+def load_samples(images_dir=None, synthetic=0, seed=0):
+    samples = []
+    if images_dir:
+        from app.utils.export_model import list_images
+        for path in list_images(images_dir):
+            with open(path, "rb") as f:
+                samples.append((f.read(), None))
+    rng = np.random.default_rng(seed)
+    samples.extend(synthetic_plate_image(rng) for _ in range(synthetic))
+    return samples
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds * 1000.0)
+
+
+# Один запрос: батч кадров проходит все стадии реального пайплайна ml_controller
+def run_request(batch, timer):
+    from app.controllers.ml_controller import (
+        detect_license_plates_batch, get_detector, plate_recognizer, preprocess_license_plate
+    )
+
+    start = time.perf_counter()
+    images = [decode_image(data) for data, _ in batch]
+    timer.add("decode", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    detections = detect_license_plates_batch(images, get_detector(), [1] * len(images))
+    timer.add("detect", time.perf_counter() - start)
+
+    responses = []
+    for image, bboxes, (_, truth) in zip(images, detections, batch):
+        # Для синтетических кадров без детекции стадии OCR измеряются на известном боксе номера
+        bboxes = bboxes or ([truth] if truth else [])
+        plates = []
+        for bbox in bboxes:
+            start = time.perf_counter()
+            processed = preprocess_license_plate(image, bbox)
+            timer.add("preprocess", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            text, score, path = plate_recognizer.recognize(processed)
+            timer.add("ocr", time.perf_counter() - start)
+            plates.append({"bbox_2d": list(bbox[:4]), "license_plate": text, "confidence": score, "ocr_path": path})
+        responses.append({"plates": plates})
+
+    start = time.perf_counter()
+    json.dumps(responses, ensure_ascii=False, default=float)
+    timer.add("serialize", time.perf_counter() - start)
+
+
+def _timed_request(batch, timer):
+    start = time.perf_counter()
+    run_request(batch, timer)
+    return (time.perf_counter() - start) * 1000.0
+
+
+# Процесс бенчмарка загружает и прогревает собственные модели
+def _init_process():
+    from app.utils.warmup import warmup_models
+    warmup_models(runs=1)
+
+
+def _process_ready():
+    return os.getpid()
+
+
+def _process_request(batch):
+    timer = StageTimer()
+    latency = _timed_request(batch, timer)
+    return latency, dict(timer.samples)
+
+
+def run_config(samples, concurrency, batch_size, requests):
+    timer = StageTimer()
+    latencies = []
+    batches = [[samples[(i * batch_size + j) % len(samples)] for j in range(batch_size)] for i in range(requests)]
+
+    if concurrency <= 1:
+        start = time.perf_counter()
+        latencies = [_timed_request(batch, timer) for batch in batches]
+        elapsed = time.perf_counter() - start
+    else:
+        with ProcessPoolExecutor(max_workers=concurrency, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_process) as executor:
+            # Запуск и прогрев процессов не входит в замер
+            for future in [executor.submit(_process_ready) for _ in range(concurrency)]:
+                future.result()
+            start = time.perf_counter()
+            for latency, stage_samples in executor.map(_process_request, batches):
+                latencies.append(latency)
+                for stage, values in stage_samples.items():
+                    timer.samples[stage].extend(values)
+            elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "mode": "processes" if concurrency > 1 else "in_process",
+        "batch_size": batch_size,
+        "requests": requests,
+        "images": requests * batch_size,
+        "elapsed_s": elapsed,
+        "throughput_images_per_s": requests * batch_size / elapsed if elapsed else None,
+        "throughput_requests_per_s": requests / elapsed if elapsed else None,
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {stage: percentiles(timer.samples.get(stage, [])) for stage in STAGES},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Бенчмарк стадий пайплайна распознавания номеров")
+    parser.add_argument("--images", help="папка с изображениями")
+    parser.add_argument("--synthetic", type=int, default=None, help="число синтетических кадров (по умолчанию 32 без --images)")
+    parser.add_argument("--concurrency", type=_int_list, default=[1], help="список уровней параллелизма, например 1,4")
+    parser.add_argument("--batch-size", type=_int_list, default=[1], help="список размеров батча, например 1,8")
+    parser.add_argument("--requests", type=int, default=50, help="запросов на конфигурацию")
+    parser.add_argument("--warmup", type=int, default=3, help="прогревочных запросов (не учитываются)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для JSON-отчета")
+    args = parser.parse_args()
+
+    synthetic = args.synthetic if args.synthetic is not None else (0 if args.images else 32)
+    samples = load_samples(args.images, synthetic, args.seed)
+    if not samples:
+        raise SystemExit("Нет изображений для бенчмарка")
+    random.Random(args.seed).shuffle(samples)
+
+    from app.controllers.ml_controller import get_detector, models_info
+    from app.utils.detector_backends import DETECTOR_BACKEND, DETECTOR_INT8
+    get_detector()
+    warmup_timer = StageTimer()
+    for i in range(args.warmup):
+        run_request([samples[i % len(samples)]], warmup_timer)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "backend": DETECTOR_BACKEND,
+        "int8": DETECTOR_INT8,
+        "models": models_info(),
+        "samples": len(samples),
+        "cpu_count": os.cpu_count(),
+        "results": [
+            run_config(samples, concurrency, batch_size, args.requests)
+            for concurrency in args.concurrency
+            for batch_size in args.batch_size
+        ],
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info("Отчет сохранен в %s", args.output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import logging
+import os
+from datetime import timedelta
+
+from sqlalchemy import func
+
+from app.db.models import Booking, BookingChange
+
+logger = logging.getLogger(__name__)
+
+# Запас при чтении журнала (сек): запись с меньшим changed_at может быть зафиксирована позже уже прочитанных,
+# поэтому журнал перечитывается начиная с changed_at на этот запас раньше отметки прошлого чтения
+BOOKING_CHANGES_LOOKBACK_SECONDS = float(os.getenv("BOOKING_CHANGES_LOOKBACK_SECONDS", "60"))
+# Сколько хранить записи журнала (сек); старые удаляются при полной перезагрузке индексов
+BOOKING_CHANGES_RETENTION_SECONDS = float(os.getenv("BOOKING_CHANGES_RETENTION_SECONDS", "86400"))
+
+
+# Отметка журнала: время последней записи по часам БД. Берется до чтения данных, чтобы изменения,
+# зафиксированные во время чтения, попали в следующее
+def changes_watermark(db):
+    return db.query(func.max(BookingChange.changed_at)).scalar()
+
+
+# Брони, изменившиеся начиная с отметки since (с запасом): booking_id и текущие значения columns.
+# Для удаленных броней значения None. Одна строка на бронь: применять можно повторно и в любом порядке
+def changed_bookings(db, since, *columns):
+    query = db.query(BookingChange.booking_id, *columns).outerjoin(Booking, Booking.id == BookingChange.booking_id)
+    if since is not None:
+        query = query.filter(
+            BookingChange.changed_at >= since - timedelta(seconds=BOOKING_CHANGES_LOOKBACK_SECONDS)
+        )
+    return query.distinct().all()
+
+
+# Удаление записей журнала старше срока хранения (считается от отметки, по часам БД)
+def prune_changes(db, watermark):
+    if watermark is None:
+        return
+    deleted = db.query(BookingChange).filter(
+        BookingChange.changed_at < watermark - timedelta(seconds=BOOKING_CHANGES_RETENTION_SECONDS)
+    ).delete(synchronize_session=False)
+    db.commit()
+    if deleted:
+        logger.info("Удалено %d старых записей журнала изменений бронирований", deleted)
@@ -1,6 +1,10 @@
 from sqlalchemy.orm import Session
 from app.db.models import Resident, Car, ParkingSpot, Booking, Log
-from datetime import datetime
+from app.utils.plate_index import active_plate_index, registered_plate_index
+from app.utils.availability_index import availability_index
+from app.utils.async_database_utils import spot_is_booked, _insert_booking_if_free, SpotUnavailableError
+from app.utils.plates import canonical_plate
+from datetime import datetime, timedelta
 
 # Создание записи в таблице Residents
 def create_resident(db: Session, tg_id: int):
@@ -35,8 +39,11 @@ def update_resident(db: Session, tg_id: int, new_name: str):
 def delete_resident(db: Session, tg_id: int):
     resident = db.query(Resident).filter(Resident.tg_id == tg_id).first()
     if resident:
+        plate_keys = [car.plate_key for car in resident.cars]
         db.delete(resident)
         db.commit()
+        for plate_key in plate_keys:
+            registered_plate_index.remove(plate_key)
     return resident
 
 # Создание парковочного места
@@ -45,6 +52,7 @@ def create_parking_spot(db: Session, parking_spot_number: str, description: str)
     db.add(spot)
     db.commit()
     db.refresh(spot)
+    availability_index.add_spot(spot)
     return spot
 
 # Получение всех парковочных мест
@@ -58,6 +66,7 @@ def update_parking_spot(db: Session, spot_id: int, new_description: str):
         spot.description = new_description
         db.commit()
         db.refresh(spot)
+        availability_index.add_spot(spot)
     return spot
 
 # Удаление парковочного места
@@ -66,6 +75,7 @@ def delete_parking_spot(db: Session, spot_id: int):
     if spot:
         db.delete(spot)
         db.commit()
+        availability_index.remove_spot(spot_id)
     return spot
 
 # Получение жителя по tg_id
@@ -78,28 +88,33 @@ def create_car(db: Session, resident_id: int, car_plate: str):
     db.add(car)
     db.commit()
     db.refresh(car)
+    registered_plate_index.add(car.plate_key, car.car_plate)
     return car
 
-# Получение автомобиля по car_plate и owner_id
+# Получение автомобиля по car_plate и owner_id (сравнение по каноническому ключу номера)
 def get_car_by_plate_and_owner(db: Session, car_plate: str, owner_id: int):
-    return db.query(Car).filter(Car.car_plate == car_plate, Car.owner_id == owner_id).first()
+    return db.query(Car).filter(Car.plate_key == canonical_plate(car_plate), Car.owner_id == owner_id).first()
 
-# Получение всех автомобилей для конкретного жителя по tg_id
+# Получение автомобиля по каноническому ключу номера среди всех владельцев
+def get_car_by_plate(db: Session, car_plate: str):
+    return db.query(Car).filter(Car.plate_key == canonical_plate(car_plate)).first()
+
+# Получение всех автомобилей для конкретного жителя по tg_id (один запрос с join вместо ленивой загрузки)
 def get_cars_by_tg_id(db: Session, tg_id: int):
-    resident = get_resident_by_tg_id(db, tg_id)
-    if resident:
-        return resident.cars
-    return []
+    return db.query(Car).join(Resident, Car.owner_id == Resident.id).filter(Resident.tg_id == tg_id).all()
 
 # Получение всех парковочных мест
 def get_all_parking_spots(db: Session):
     return db.query(ParkingSpot).all()
 
-# Получение свободных парковочных мест
-def get_free_parking_spots(db: Session):
-    return db.query(ParkingSpot).filter_by(is_reserved=False).all()
+# Свободные в окне [start_time, end_time) парковочные места; по умолчанию - ближайший час
+def get_free_parking_spots(db: Session, start_time: datetime = None, end_time: datetime = None):
+    start_time = start_time or datetime.now()
+    end_time = end_time or start_time + timedelta(hours=1)
+    return db.query(ParkingSpot).filter(~spot_is_booked(ParkingSpot.id, start_time, end_time)).all()
 
-# Создание бронирования
+# Создание бронирования, если у места нет пересекающихся бронирований (иначе SpotUnavailableError).
+# Как и в асинхронной версии, брони одного места в Postgres выстраиваются на блокировке строки места
 def create_booking(db: Session, resident_id: int, spot_id: int, car_plate: str, start_time: datetime, end_time: datetime):
     booking = Booking(
         resident_id=resident_id,
@@ -108,23 +123,23 @@ def create_booking(db: Session, resident_id: int, spot_id: int, car_plate: str,
         start_time=start_time,
         end_time=end_time
     )
-    spot = db.query(ParkingSpot).filter_by(id=spot_id).first()
-    if spot:
-        spot.is_reserved = True
-    db.add(booking)
+    db.query(ParkingSpot.id).filter(ParkingSpot.id == spot_id).with_for_update().first()
+    booking.id = db.execute(_insert_booking_if_free(booking)).scalar()
     db.commit()
-    db.refresh(booking)
+    if booking.id is None:
+        raise SpotUnavailableError(f"Spot {spot_id} is already booked for this period")
+    active_plate_index.add(booking)
+    availability_index.add(booking)
     return booking
 
 # Отмена бронирования
 def cancel_booking(db: Session, booking_id: int):
     booking = db.query(Booking).filter_by(id=booking_id).first()
     if booking:
-        spot = db.query(ParkingSpot).filter_by(id=booking.spot_id).first()
-        if spot:
-            spot.is_reserved = False
         db.delete(booking)
         db.commit()
+        active_plate_index.remove(booking_id)
+        availability_index.remove(booking_id)
     return booking
 
 # Получение всех бронирований для жителя
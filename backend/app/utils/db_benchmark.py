@@ -0,0 +1,225 @@
+"""
+Бенчмарк пропускной способности обработчиков с БД: синхронная сессия внутри async-обработчика
+(как было до перехода на AsyncSession) против асинхронной сессии.
+Каждый "запрос" повторяет запросы эндпоинтов /booking/view-reservations и /booking/get-free-spots.
+Параллельно измеряется задержка цикла событий: с синхронной сессией он блокируется на время запроса к БД.
+--check-queries проверяет число SQL-запросов на эндпоинт (QUERY_BUDGETS) и завершается с ошибкой при превышении.
+
+Примеры:
+    python -m app.utils.db_benchmark --seed --concurrency 1,16,64 --requests 500
+    python -m app.utils.db_benchmark --seed --check-queries
+    DATABASE_URL=sqlite:///./bench.db python -m app.utils.db_benchmark --seed
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi import Response
+
+from app.db.database import SessionLocal, AsyncSessionLocal, async_engine, init_db
+from app.db.models import Resident, Car, ParkingSpot
+from app.db.query_counter import count_queries
+from app.utils import database_utils, async_database_utils
+
+logger = logging.getLogger(__name__)
+
+SEED_TG_ID_BASE = 9_000_000_000
+SEED_CAR_PLATE = "bench000"
+
+# Допустимое число SQL-запросов на вызов эндпоинта
+QUERY_BUDGETS = {
+    "view_residents": 1,
+    "get_free_spots": 1,
+    "get_resident_cars": 1,
+    "view_reservations": 1,
+    "reserve_parking": 4,
+    "cancel_reservation": 1,
+}
+
+
+def seed(residents=100, spots=200):
+    db = SessionLocal()
+    try:
+        existing = db.query(Resident).filter(Resident.tg_id >= SEED_TG_ID_BASE).count()
+        if existing < residents:
+            db.add_all(Resident(tg_id=SEED_TG_ID_BASE + i, name=f"bench-{i}") for i in range(existing, residents))
+        existing = db.query(ParkingSpot).filter(ParkingSpot.parking_spot_number.like("bench-%")).count()
+        if existing < spots:
+            db.add_all(ParkingSpot(parking_spot_number=f"bench-{i}", description="benchmark", is_reserved=False)
+                       for i in range(existing, spots))
+        db.commit()
+        if not db.query(Car).filter(Car.car_plate == SEED_CAR_PLATE).count():
+            owner = db.query(Resident).filter(Resident.tg_id == SEED_TG_ID_BASE).one()
+            db.add(Car(car_plate=SEED_CAR_PLATE, owner_id=owner.id))
+            db.commit()
+    finally:
+        db.close()
+
+
+# Обработчик до перехода: синхронные запросы прямо в корутине
+async def sync_handler(tg_id):
+    db = SessionLocal()
+    try:
+        resident = database_utils.get_resident_by_tg_id(db, tg_id)
+        if resident:
+            database_utils.get_resident_bookings(db, resident.id)
+        database_utils.get_free_parking_spots(db)
+    finally:
+        db.close()
+
+
+async def async_handler(tg_id):
+    async with AsyncSessionLocal() as db:
+        await async_database_utils.get_bookings_by_tg_id(db, tg_id)
+        start = datetime.now()
+        await async_database_utils.get_free_parking_spots(db, start, start + timedelta(hours=1))
+
+
+# Вызов обработчика эндпоинта в отдельной сессии с подсчетом SQL-запросов
+async def _count_endpoint(name, call, report):
+    async with AsyncSessionLocal() as db:
+        with count_queries(async_engine) as counter:
+            result = await call(db)
+    report[name] = {"queries": counter.count, "budget": QUERY_BUDGETS[name], "statements": counter.statements}
+    return result
+
+
+async def check_query_budgets():
+    from app.controllers import booking_controller, parking_controller
+
+    tg_id = SEED_TG_ID_BASE
+    start = datetime.now() + timedelta(days=365)
+    end = start + timedelta(hours=1)
+    async with AsyncSessionLocal() as db:
+        spots = await async_database_utils.get_free_parking_spots(db, start, end, limit=1)
+    if not spots:
+        raise SystemExit("Нет свободных мест для проверки: запустите с --seed")
+
+    report = {}
+    await _count_endpoint("view_residents", lambda db: parking_controller.view_residents(
+        after_id=None, limit=async_database_utils.PAGE_SIZE, stream=False, db=db), report)
+    await _count_endpoint("get_free_spots", lambda db: booking_controller.get_free_spots(
+        Response(), start_time=start.timestamp(), end_time=end.timestamp(), after_id=None, limit=100,
+        stream=False, db=db), report)
+    await _count_endpoint("get_resident_cars", lambda db: booking_controller.get_resident_cars(tg_id, db=db), report)
+    await _count_endpoint("view_reservations", lambda db: booking_controller.view_reservations(tg_id, db=db), report)
+    booking = await _count_endpoint("reserve_parking", lambda db: booking_controller.reserve_parking(
+        tg_id, spots[0].id, SEED_CAR_PLATE, start.timestamp(), end.timestamp(), db=db), report)
+    await _count_endpoint("cancel_reservation", lambda db: booking_controller.cancel_reservation(
+        booking["booking_id"], db=db), report)
+    await async_engine.dispose()
+    return report
+
+
+# Задержка цикла событий: насколько позже планового просыпается периодическая задача
+async def loop_lag_probe(samples, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - expected) * 1000.0)
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+async def run_config(handler, concurrency, requests, residents):
+    latencies, lag = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(SEED_TG_ID_BASE + i % residents)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    probe = asyncio.create_task(loop_lag_probe(lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "elapsed_s": elapsed,
+        "requests_per_s": requests / elapsed if elapsed else None,
+        "latency_ms": percentiles(latencies),
+        "loop_lag_ms": percentiles(lag),
+    }
+
+
+async def run(concurrency_levels, requests, residents):
+    results = []
+    for name, handler in (("sync_session", sync_handler), ("async_session", async_handler)):
+        # Прогрев пулов соединений
+        await run_config(handler, max(concurrency_levels), max(concurrency_levels), residents)
+        for concurrency in concurrency_levels:
+            result = await run_config(handler, concurrency, requests, residents)
+            results.append({"mode": name, **result})
+            logger.info("%s c=%d: %.1f req/s, p95 %.1f мс, лаг цикла p95 %.1f мс", name, concurrency,
+                        result["requests_per_s"], result["latency_ms"]["p95"], result["loop_lag_ms"].get("p95", 0.0))
+    await async_engine.dispose()
+    return results
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронной и асинхронной сессии БД")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 16, 64], help="уровни параллелизма, например 1,16,64")
+    parser.add_argument("--requests", type=int, default=500, help="запросов на конфигурацию")
+    parser.add_argument("--residents", type=int, default=100, help="число тестовых жителей")
+    parser.add_argument("--seed", action="store_true", help="создать таблицы и тестовые данные")
+    parser.add_argument("--check-queries", action="store_true", help="проверить число SQL-запросов на эндпоинт")
+    parser.add_argument("--output", help="файл для JSON-отчета")
+    args = parser.parse_args()
+
+    if args.seed:
+        init_db()
+        seed(args.residents)
+
+    if args.check_queries:
+        report = asyncio.run(check_query_budgets())
+        failed = [name for name, entry in report.items() if entry["queries"] > entry["budget"]]
+        for name, entry in report.items():
+            logger.info("%s: %d запросов (допустимо %d)", name, entry["queries"], entry["budget"])
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        if failed:
+            logger.error("Превышено число запросов: %s", ", ".join(failed))
+            sys.exit(1)
+        return
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "database": SessionLocal.kw["bind"].url.render_as_string(hide_password=True),
+        "results": asyncio.run(run(args.concurrency, args.requests, args.residents)),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info("Отчет сохранен в %s", args.output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
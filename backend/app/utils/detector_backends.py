@@ -0,0 +1,48 @@
+import logging
+import os
+
+from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+# Бэкенд инференса детектора: torch (best.pt), onnx (ONNX Runtime) или openvino
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "torch").lower()
+DETECTOR_PATH = os.getenv("DETECTOR_PATH", "/app/best.pt")
+DETECTOR_VERSION = os.getenv("DETECTOR_VERSION")
+# Использовать INT8-квантованные артефакты (если они были экспортированы)
+DETECTOR_INT8 = os.getenv("DETECTOR_INT8", "false").lower() in ("1", "true", "yes")
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+# Путь к артефакту модели для бэкенда; артефакты лежат рядом с best.pt
+def artifact_path(weights_path, backend, int8=False):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+    if backend == "torch" or not weights_path.endswith(".pt"):
+        return weights_path
+    stem = weights_path[:-len(".pt")]
+    if backend == "onnx":
+        return f"{stem}_int8.onnx" if int8 else f"{stem}.onnx"
+    return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+
+
+# Загрузка детектора для выбранного бэкенда; все бэкенды возвращают объект YOLO
+def load_detector(backend=None, weights_path=None, int8=None):
+    backend = (backend or DETECTOR_BACKEND).lower()
+    weights_path = weights_path or DETECTOR_PATH
+    int8 = DETECTOR_INT8 if int8 is None else int8
+
+    path = artifact_path(weights_path, backend, int8)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Detector artifact {path} not found; run `python -m app.utils.export_model --format {backend}`"
+        )
+    logger.info("Загрузка детектора %s (%s)", path, backend)
+    return YOLO(path, task="detect")
+
+
+# Регистрация детектора в реестре моделей (загрузка произойдет при первом обращении)
+def register_detector(registry, name="detector"):
+    registry.register(name, lambda path: load_detector(weights_path=path), DETECTOR_PATH, DETECTOR_VERSION)
+    return name
@@ -0,0 +1,202 @@
+"""
+Экспорт детектора best.pt в ONNX / OpenVINO IR, опциональная INT8-квантизация
+и проверка совпадения боксов с PyTorch-моделью.
+
+Примеры:
+    python -m app.utils.export_model --format onnx --parity-dir ./samples
+    python -m app.utils.export_model --format openvino --int8 --calib-dir ./samples
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from app.utils.detector_backends import DETECTOR_PATH, artifact_path, load_detector
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def list_images(folder, limit=None):
+    paths = sorted(
+        path for path in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+# Letterbox-преобразование кадра во входной тензор модели (1, 3, imgsz, imgsz)
+def letterbox_tensor(image, imgsz):
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    tensor = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+    return np.ascontiguousarray(tensor[np.newaxis], dtype=np.float32) / 255.0
+
+
+# YAML-описание датасета из папки с изображениями (для калибровки OpenVINO INT8)
+def _calibration_yaml(calib_dir, workdir):
+    path = os.path.join(workdir, "calibration.yaml")
+    folder = os.path.abspath(calib_dir)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"path: {folder}\ntrain: {folder}\nval: {folder}\nnames:\n  0: license_plate\n")
+    return path
+
+
+def _quantize_onnx(fp32_path, int8_path, calib_dir, imgsz, calib_size):
+    try:
+        import onnxruntime
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError:
+        raise SystemExit("INT8-квантизация ONNX требует пакет onnxruntime")
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    paths = list_images(calib_dir, calib_size)
+    if not paths:
+        raise SystemExit(f"В {calib_dir} нет изображений для калибровки")
+
+    class ImageFolderReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(paths)
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox_tensor(image, imgsz)}
+            return None
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        ImageFolderReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    logger.info("INT8 ONNX сохранена: %s (калибровка на %d изображениях)", int8_path, len(paths))
+
+
+def export(weights, fmt, imgsz=640, int8=False, calib_dir=None, calib_size=200):
+    if int8 and not calib_dir:
+        raise SystemExit("Для INT8 нужен --calib-dir с изображениями для калибровки")
+
+    model = YOLO(weights)
+    if fmt == "onnx":
+        fp32_path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        logger.info("ONNX сохранена: %s", fp32_path)
+        if int8:
+            _quantize_onnx(fp32_path, artifact_path(weights, "onnx", int8=True), calib_dir, imgsz, calib_size)
+    elif fmt == "openvino":
+        if int8:
+            with tempfile.TemporaryDirectory() as workdir:
+                path = model.export(format="openvino", imgsz=imgsz, int8=True,
+                                    data=_calibration_yaml(calib_dir, workdir), fraction=1.0)
+        else:
+            path = model.export(format="openvino", imgsz=imgsz)
+        logger.info("OpenVINO IR сохранена: %s", path)
+    else:
+        raise SystemExit(f"Неизвестный формат: {fmt}")
+
+
+def _box_iou(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _predict(model, image):
+    start = time.perf_counter()
+    result = model(image, verbose=False)[0]
+    elapsed = (time.perf_counter() - start) * 1000.0
+    return result.boxes.data.cpu().numpy(), elapsed
+
+
+# Сравнение боксов кандидата с PyTorch-моделью: каждому эталонному боксу
+# должен соответствовать бокс того же класса с IoU >= min_iou и близким score
+def check_parity(reference, candidate, image_paths, min_iou=0.9, score_tol=0.05):
+    report = {"images": 0, "mismatches": [], "reference_ms": [], "candidate_ms": []}
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        ref_boxes, ref_ms = _predict(reference, image)
+        cand_boxes, cand_ms = _predict(candidate, image)
+        report["images"] += 1
+        report["reference_ms"].append(ref_ms)
+        report["candidate_ms"].append(cand_ms)
+
+        if len(ref_boxes) != len(cand_boxes):
+            report["mismatches"].append({"image": path, "reason": f"{len(ref_boxes)} vs {len(cand_boxes)} boxes"})
+            continue
+        if not len(ref_boxes):
+            continue
+        iou = _box_iou(ref_boxes[:, :4], cand_boxes[:, :4])
+        iou[ref_boxes[:, None, 5] != cand_boxes[None, :, 5]] = 0.0
+        best = iou.argmax(axis=1)
+        best_iou = iou[np.arange(len(ref_boxes)), best]
+        score_diff = np.abs(ref_boxes[:, 4] - cand_boxes[best, 4])
+        if (best_iou < min_iou).any() or (score_diff > score_tol).any():
+            report["mismatches"].append({
+                "image": path,
+                "reason": f"min IoU {best_iou.min():.3f}, max score diff {score_diff.max():.3f}",
+            })
+
+    for key in ("reference_ms", "candidate_ms"):
+        times = report.pop(key)
+        report[key.replace("_ms", "_mean_ms")] = float(np.mean(times)) if times else None
+    report["passed"] = report["images"] > 0 and not report["mismatches"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт детектора номеров в ONNX / OpenVINO")
+    parser.add_argument("--weights", default=DETECTOR_PATH, help="путь к best.pt")
+    parser.add_argument("--format", choices=["onnx", "openvino", "all"], default="onnx")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="INT8-квантизация после обучения")
+    parser.add_argument("--calib-dir", help="папка с изображениями для калибровки INT8")
+    parser.add_argument("--calib-size", type=int, default=200, help="число изображений для калибровки")
+    parser.add_argument("--parity-dir", help="папка с изображениями для проверки совпадения боксов")
+    parser.add_argument("--min-iou", type=float, default=0.9)
+    parser.add_argument("--score-tol", type=float, default=0.05)
+    args = parser.parse_args()
+
+    formats = ["onnx", "openvino"] if args.format == "all" else [args.format]
+    for fmt in formats:
+        export(args.weights, fmt, args.imgsz, args.int8, args.calib_dir, args.calib_size)
+
+    if args.parity_dir:
+        reference = load_detector("torch", args.weights)
+        images = list_images(args.parity_dir)
+        failed = False
+        for fmt in formats:
+            report = check_parity(reference, load_detector(fmt, args.weights, args.int8), images,
+                                  args.min_iou, args.score_tol)
+            print(json.dumps({"backend": fmt, "int8": args.int8, **report}, ensure_ascii=False, indent=2))
+            failed = failed or not report["passed"]
+        if failed:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import struct
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+
+# Максимальный размер загружаемого изображения (байт)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+# Максимальное число пикселей загружаемого изображения: несколько килобайт PNG могут
+# распаковаться в гигабайты, поэтому размер проверяется по заголовку до декодирования
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(25_000_000)))
+_READ_CHUNK_SIZE = 64 * 1024
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Маркеры JPEG без сегмента длины
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+# Маркеры SOF (начало кадра с размерами): C0-CF, кроме DHT (C4), JPG (C8) и DAC (CC)
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+# Декодирование изображения из байтов в BGR-массив без записи на диск
+def decode_image(data: bytes):
+    if not data:
+        return None
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+# Чтение загруженного файла в память с ограничением размера
+async def read_upload(file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(status_code=413, detail=f"File is too large (max {max_size} bytes)")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# Размеры (ширина, высота) из заголовка PNG или JPEG; None, если формат другой или заголовок не найден
+def image_size(data: bytes):
+    if data[:8] == _PNG_SIGNATURE and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+        elif marker in _JPEG_STANDALONE_MARKERS:
+            i += 2
+        elif marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        else:
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+def _check_pixels(width, height, max_pixels):
+    if width * height > max_pixels:
+        raise HTTPException(status_code=413, detail=f"Image is too large (max {max_pixels} pixels)")
+
+
+# Декодирование загруженного изображения: не изображение - 400, больше max_pixels пикселей - 413.
+# Для PNG и JPEG размер проверяется по заголовку, для остальных форматов - после декодирования
+def decode_upload_image(data: bytes, max_pixels: int = MAX_IMAGE_PIXELS):
+    size = image_size(data)
+    if size is not None:
+        _check_pixels(*size, max_pixels)
+    image = decode_image(data)
+    if image is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    _check_pixels(image.shape[1], image.shape[0], max_pixels)
+    return image
+
+
+# Чтение и декодирование загруженного изображения
+async def read_upload_image(file: UploadFile, max_size: int = MAX_UPLOAD_SIZE):
+    return decode_upload_image(await read_upload(file, max_size))
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов инференса (0 - выполнять в потоке текущего процесса)
+ML_WORKERS = int(os.getenv("ML_WORKERS", "1"))
+# Максимальное число изображений, ожидающих обработки, и таймаут одного вызова (сек)
+ML_QUEUE_SIZE = int(os.getenv("ML_QUEUE_SIZE", "64"))
+ML_TIMEOUT = float(os.getenv("ML_TIMEOUT", "30"))
+# Количество потоков torch в каждом процессе инференса
+ML_WORKER_THREADS = int(os.getenv("ML_WORKER_THREADS", "1"))
+
+
+class PoolSaturatedError(Exception):
+    pass
+
+
+class PoolReplaceError(Exception):
+    pass
+
+
+# Копирование изображения в разделяемую память; возвращает сегмент и его описание
+def _to_shared(image):
+    shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+    view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+    view[:] = image
+    del view
+    return shm, (shm.name, image.shape, image.dtype.str)
+
+
+def _release_shared(segments):
+    for shm in segments:
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker(overrides=None):
+    try:
+        import torch
+        torch.set_num_threads(ML_WORKER_THREADS)
+    except ImportError:
+        pass
+    # Пути и версии моделей из родительского процесса (после горячей замены весов)
+    from app.utils.model_registry import model_registry
+    model_registry.configure(overrides)
+
+    # Загрузка и прогрев моделей при старте процесса, а не на первом запросе
+    from app.utils.warmup import warmup_models
+    warmup_models()
+
+
+def _noop():
+    return os.getpid()
+
+
+# Проверка процесса нового пула: все модели загружаются (обычно уже загружены инициализатором)
+def _load_models():
+    from app.utils.model_registry import model_registry
+    for name in model_registry.names():
+        model_registry.get(name)
+    return os.getpid()
+
+
+def _run_task(task, images, *args):
+    # Импорт внутри функции: модель загружается один раз в каждом процессе при первом вызове
+    from app.controllers.ml_controller import run_inference_task
+    return run_inference_task(task, images, *args)
+
+
+def _worker_run(task, descriptors, *args):
+    images = []
+    for name, shape, dtype in descriptors:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Копия в памяти процесса: предиктор YOLO хранит ссылки на входные кадры,
+            # а сегмент нельзя закрыть, пока на его буфер есть ссылки
+            images.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy())
+        finally:
+            shm.close()
+    return _run_task(task, images, *args)
+
+
+class InferencePool:
+    """
+    Пул процессов инференса. Кадры передаются через multiprocessing.shared_memory,
+    количество ожидающих изображений ограничено max_pending, каждый вызов - timeout.
+    Место в очереди освобождается, когда задача действительно завершилась в пуле: после таймаута
+    ожидания она еще выполняется и продолжает занимать процесс.
+    """
+
+    def __init__(self, workers=ML_WORKERS, max_pending=ML_QUEUE_SIZE, timeout=ML_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.broken = 0
+        self._executor = None
+        self._overrides = None
+        # pending уменьшается из потока пула (done-callback), увеличивается из цикла событий
+        self._pending_lock = threading.Lock()
+
+    def _release_pending(self, count):
+        with self._pending_lock:
+            self.pending -= count
+
+    def _new_executor(self, overrides):
+        if self.workers > 0:
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(overrides,),
+            )
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._new_executor(self._overrides)
+        return self._executor
+
+    # Процесс пула упал (OOM, segfault): ProcessPoolExecutor больше не принимает задачи,
+    # следующий запрос создаст новый пул
+    def _drop_broken(self, executor):
+        if self._executor is executor:
+            logger.error("Пул инференса сломан (процесс завершился аварийно), пул будет пересоздан")
+            self._executor = None
+            self.broken += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # Запуск процессов пула заранее, чтобы они успели загрузить модели
+    def start(self):
+        executor = self._get_executor()
+        if self.workers > 0:
+            for _ in range(self.workers):
+                executor.submit(_noop)
+
+    def _submit(self, executor, task, images, args):
+        if self.workers <= 0:
+            return executor.submit(_run_task, task, images, *args)
+
+        segments, descriptors = [], []
+        try:
+            for image in images:
+                shm, descriptor = _to_shared(image)
+                segments.append(shm)
+                descriptors.append(descriptor)
+            future = executor.submit(_worker_run, task, descriptors, *args)
+        except Exception:
+            _release_shared(segments)
+            raise
+        future.add_done_callback(lambda _: _release_shared(segments))
+        return future
+
+    async def run(self, task, images, *args):
+        with self._pending_lock:
+            if self.pending + len(images) > self.max_pending:
+                self.rejected += 1
+                raise PoolSaturatedError(f"Inference queue is full ({self.max_pending})")
+            self.pending += len(images)
+
+        executor = self._get_executor()
+        submitted = None
+        try:
+            submitted = self._submit(executor, task, images, args)
+            submitted.add_done_callback(lambda _: self._release_pending(len(images)))
+            result = await asyncio.wait_for(asyncio.wrap_future(submitted), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except BrokenProcessPool:
+            self._drop_broken(executor)
+            raise
+        finally:
+            # Задача не попала в пул: освобождать место будет некому
+            if submitted is None:
+                self._release_pending(len(images))
+        self.completed += 1
+        return result
+
+    # Выполнение произвольной функции в процессе пула (например, для диагностики)
+    async def call(self, fn, *args):
+        executor = self._get_executor()
+        try:
+            future = asyncio.wrap_future(executor.submit(fn, *args))
+            return await asyncio.wait_for(future, self.timeout)
+        except BrokenProcessPool:
+            self._drop_broken(executor)
+            raise
+
+    # Замена пула на пул с новыми весами без простоя: новый пул запускается и загружает модели
+    # в стороне, текущий продолжает обслуживать запросы. Если новые процессы не поднялись
+    # за timeout, пул не меняется и выбрасывается PoolReplaceError. Старый пул дорабатывает
+    # принятые задачи и закрывается
+    async def replace(self, overrides, timeout):
+        new = self._new_executor(overrides)
+        try:
+            checks = [asyncio.wrap_future(new.submit(_load_models)) for _ in range(self.workers)]
+            await asyncio.wait_for(asyncio.gather(*checks), timeout)
+        except Exception as e:
+            new.shutdown(wait=False, cancel_futures=True)
+            raise PoolReplaceError(f"New inference workers failed to load models: {e!r}") from e
+        old, self._executor, self._overrides = self._executor, new, overrides
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "broken": self.broken,
+        }
+
+
+inference_pool = InferencePool()
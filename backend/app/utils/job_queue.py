@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Максимум заданий в очереди, число одновременно обрабатываемых заданий и дедлайн задания (сек)
+ML_JOBS_MAX_QUEUED = int(os.getenv("ML_JOBS_MAX_QUEUED", "64"))
+ML_JOBS_CONCURRENCY = int(os.getenv("ML_JOBS_CONCURRENCY", "2"))
+ML_JOB_DEADLINE = float(os.getenv("ML_JOB_DEADLINE", "60"))
+# Сколько хранить завершенные задания (сек)
+ML_JOB_TTL = float(os.getenv("ML_JOB_TTL", "600"))
+# Хранилище статусов: memory или sqlite (статусы и результаты переживают перезапуск процесса)
+ML_JOBS_STORE = os.getenv("ML_JOBS_STORE", "memory")
+ML_JOBS_SQLITE_PATH = os.getenv("ML_JOBS_SQLITE_PATH", "ml_jobs.sqlite3")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+EXPIRED = "expired"
+FINISHED = (DONE, FAILED, EXPIRED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MemoryJobStore:
+    """
+    Статусы и результаты заданий в памяти процесса.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    # Удаление завершенных заданий, обновленных раньше before
+    def purge(self, before):
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in FINISHED and job["updated_at"] < before]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+    # Задания, не завершенные к моменту старта (при памяти процесса таких нет)
+    def interrupt_unfinished(self):
+        return 0
+
+
+class SqliteJobStore:
+    """
+    Статусы и результаты заданий в SQLite. Изображения в базу не пишутся:
+    незавершенные при перезапуске задания помечаются как failed.
+    """
+
+    COLUMNS = ("id", "status", "created_at", "updated_at", "deadline", "result", "error")
+
+    def __init__(self, path=ML_JOBS_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ml_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "deadline REAL NOT NULL, result TEXT, error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_ml_jobs_status_updated ON ml_jobs (status, updated_at)")
+        self._conn.commit()
+
+    def create(self, job):
+        self._write(
+            "INSERT INTO ml_jobs (id, status, created_at, updated_at, deadline, result, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["status"], job["created_at"], job["updated_at"], job["deadline"],
+             json.dumps(job["result"], ensure_ascii=False, default=float) if job["result"] is not None else None,
+             job["error"])
+        )
+
+    def update(self, job_id, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False, default=float)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._write(f"UPDATE ml_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM ml_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def purge(self, before):
+        placeholders = ", ".join("?" for _ in FINISHED)
+        return self._write(
+            f"DELETE FROM ml_jobs WHERE status IN ({placeholders}) AND updated_at < ?", (*FINISHED, before)
+        )
+
+    def interrupt_unfinished(self):
+        return self._write(
+            "UPDATE ml_jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrupted by restart", time.time(), QUEUED, RUNNING)
+        )
+
+    def _write(self, sql, params):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+
+def create_job_store(kind=ML_JOBS_STORE):
+    if kind == "sqlite":
+        return SqliteJobStore()
+    if kind != "memory":
+        raise ValueError(f"Unknown job store: {kind}")
+    return MemoryJobStore()
+
+
+class JobQueue:
+    """
+    Асинхронные задания распознавания: submit() сразу возвращает id задания,
+    concurrency воркеров обрабатывают очередь через handler(payload).
+    Очередь ограничена max_queued (QueueFullError при переполнении), у каждого
+    задания есть дедлайн: просроченные задания не запускаются и прерываются.
+    Входные данные заданий хранятся только в памяти процесса. Хранилище создается
+    при первом обращении: модуль импортируется и процессами пула инференса.
+    """
+
+    def __init__(self, handler, store=None, max_queued=ML_JOBS_MAX_QUEUED, concurrency=ML_JOBS_CONCURRENCY,
+                 deadline=ML_JOB_DEADLINE, ttl=ML_JOB_TTL, name="jobs"):
+        self.handler = handler
+        self._store = store
+        self.max_queued = max(1, int(max_queued))
+        self.concurrency = max(1, int(concurrency))
+        self.deadline = float(deadline)
+        self.ttl = float(ttl)
+        self.name = name
+        self.counters = {"submitted": 0, "rejected": 0, DONE: 0, FAILED: 0, EXPIRED: 0}
+        self.running = 0
+        self._queue = None
+        self._workers = []
+        self._events = {}
+        self._last_purge = 0.0
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = create_job_store()
+            self._store.interrupt_unfinished()
+        return self._store
+
+    def _ensure_started(self):
+        if self._workers and not all(worker.done() for worker in self._workers):
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def submit(self, payload, deadline=None):
+        self._ensure_started()
+        self._purge()
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id, "status": QUEUED, "created_at": now, "updated_at": now,
+            "deadline": now + (deadline if deadline is not None else self.deadline),
+            "result": None, "error": None,
+        }
+        try:
+            self._queue.put_nowait((job_id, job["deadline"], payload))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise QueueFullError(f"Job queue is full ({self.max_queued} jobs)")
+        self.store.create(job)
+        self._events[job_id] = asyncio.Event()
+        self.counters["submitted"] += 1
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    # Ожидание завершения задания не дольше timeout секунд (long-poll)
+    async def wait(self, job_id, timeout):
+        event = self._events.get(job_id)
+        if event is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.store.get(job_id)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self.store.update(job_id, status=status, result=result, error=error, updated_at=time.time())
+        self.counters[status] += 1
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _worker(self):
+        while True:
+            job_id, deadline, payload = await self._queue.get()
+            try:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._finish(job_id, EXPIRED, error="Deadline exceeded while queued")
+                    continue
+                self.store.update(job_id, status=RUNNING, updated_at=time.time())
+                self.running += 1
+                try:
+                    result = await asyncio.wait_for(self.handler(payload), remaining)
+                except asyncio.TimeoutError:
+                    self._finish(job_id, EXPIRED, error="Deadline exceeded")
+                except Exception as e:
+                    logger.warning("Ошибка задания %s %s: %r", self.name, job_id, e)
+                    self._finish(job_id, FAILED, error=str(getattr(e, "detail", e)))
+                else:
+                    self._finish(job_id, DONE, result=result)
+                finally:
+                    self.running -= 1
+            finally:
+                self._queue.task_done()
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        self.store.purge(now - self.ttl)
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "store": type(self._store).__name__ if self._store is not None else ML_JOBS_STORE,
+            "max_queued": self.max_queued,
+            "concurrency": self.concurrency,
+            "deadline_s": self.deadline,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            **self.counters,
+        }
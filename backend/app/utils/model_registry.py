@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Каталог, из которого разрешено загружать новые веса при горячей замене
+ML_WEIGHTS_DIR = os.getenv("ML_WEIGHTS_DIR", "/app/weights")
+
+
+# Путь к новым весам внутри ML_WEIGHTS_DIR (после раскрытия ссылок и ".."); иначе ValueError
+def resolve_weights_path(path, weights_dir=ML_WEIGHTS_DIR):
+    root = os.path.realpath(weights_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Model path must be inside {weights_dir}")
+    if not os.path.isfile(resolved):
+        raise ValueError("Model path does not exist")
+    return resolved
+
+
+# Версия модели по умолчанию: имя файла и время его изменения
+def default_version(path):
+    try:
+        return f"{os.path.basename(path.rstrip(os.sep))}@{int(os.path.getmtime(path))}"
+    except OSError:
+        return os.path.basename(path.rstrip(os.sep))
+
+
+# Оценка размера весов: параметры и буферы всех torch-модулей объекта
+def _torch_bytes(model, depth=2):
+    try:
+        import torch
+    except ImportError:
+        return None
+    if isinstance(model, torch.nn.Module):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if depth == 0:
+        return None
+    total = None
+    for value in vars(model).values() if hasattr(model, "__dict__") else ():
+        size = _torch_bytes(value, depth - 1)
+        if size is not None:
+            total = (total or 0) + size
+    return total
+
+
+class ModelEntry:
+    def __init__(self, name, loader, path, version=None):
+        self.name = name
+        self.loader = loader
+        self.path = path
+        self.version = version or default_version(path)
+        self.model = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.weights_bytes = None
+        self.rss_delta_bytes = None
+        self.lock = threading.Lock()
+
+    def info(self):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "version": self.version,
+            "loaded": self.model is not None,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "weights_bytes": self.weights_bytes,
+            "rss_delta_bytes": self.rss_delta_bytes,
+        }
+
+
+class ModelRegistry:
+    """
+    Реестр всех моделей процесса (детектор, OCR). Модель загружается лениво один раз;
+    swap() загружает новые веса в стороне и атомарно подменяет ссылку,
+    запросы в обработке дорабатывают на старой модели.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._overrides = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, path, version=None):
+        with self._lock:
+            if name in self._overrides:
+                path, version = self._overrides[name]
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = ModelEntry(name, loader, path, version)
+            elif entry.model is None:
+                entry.loader, entry.path = loader, path
+                entry.version = version or default_version(path)
+            return self._entries[name]
+
+    def names(self):
+        return list(self._entries)
+
+    def _load(self, entry, path):
+        process = psutil.Process()
+        rss_before = process.memory_info().rss
+        start = time.perf_counter()
+        model = entry.loader(path)
+        load_seconds = time.perf_counter() - start
+        rss_delta = max(process.memory_info().rss - rss_before, 0)
+        logger.info("Модель %s загружена из %s за %.2f с", entry.name, path, load_seconds)
+        return model, load_seconds, rss_delta
+
+    def _install(self, entry, model, path, version, load_seconds, rss_delta):
+        entry.model = model
+        entry.path = path
+        entry.version = version
+        entry.loaded_at = time.time()
+        entry.load_seconds = load_seconds
+        entry.rss_delta_bytes = rss_delta
+        entry.weights_bytes = _torch_bytes(model)
+
+    def get(self, name):
+        entry = self._entries[name]
+        model = entry.model
+        if model is not None:
+            return model
+        with entry.lock:
+            if entry.model is None:
+                model, load_seconds, rss_delta = self._load(entry, entry.path)
+                self._install(entry, model, entry.path, entry.version, load_seconds, rss_delta)
+            return entry.model
+
+    def version(self, name):
+        return self._entries[name].version
+
+    # Горячая замена весов без перезапуска
+    def swap(self, name, path=None, version=None):
+        entry = self._entries[name]
+        path = path or entry.path
+        model, load_seconds, rss_delta = self._load(entry, path)
+        with entry.lock:
+            self._install(entry, model, path, version or default_version(path), load_seconds, rss_delta)
+        return entry.info()
+
+    # Новые путь и версия модели: по умолчанию - текущий путь и версия по файлу
+    def target(self, name, path=None, version=None):
+        path = path or self._entries[name].path
+        return path, version or default_version(path)
+
+    # Смена пути и версии без загрузки в текущем процессе (модели загружают процессы пула)
+    def retarget(self, name, path=None, version=None):
+        entry = self._entries[name]
+        path, version = self.target(name, path, version)
+        with entry.lock:
+            entry.path = path
+            entry.version = version
+        return entry.info()
+
+    # Пути и версии моделей для передачи в другие процессы; changes - {имя: (путь, версия)} поверх текущих
+    def overrides(self, changes=None):
+        overrides = {name: (entry.path, entry.version) for name, entry in self._entries.items()}
+        overrides.update(changes or {})
+        return overrides
+
+    def configure(self, overrides):
+        for name, (path, version) in (overrides or {}).items():
+            self._overrides[name] = (path, version)
+            entry = self._entries.get(name)
+            if entry is not None and entry.model is None:
+                entry.path, entry.version = path, version
+
+    def info(self):
+        return [entry.info() for entry in self._entries.values()]
+
+
+model_registry = ModelRegistry()
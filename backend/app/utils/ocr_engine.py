@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+
+import easyocr
+import numpy as np
+
+from app.utils.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Языки OCR по умолчанию и режим GPU: "auto" - использовать GPU только если он есть
+OCR_LANGS = tuple(lang.strip() for lang in os.getenv("OCR_LANGS", "ru").split(",") if lang.strip())
+OCR_GPU = os.getenv("OCR_GPU", "auto").lower()
+# Каталог с весами easyocr
+OCR_MODEL_DIR = os.getenv("OCR_MODEL_DIR", os.path.expanduser("~/.EasyOCR/model"))
+
+
+def _use_gpu():
+    if OCR_GPU in ("0", "false", "no", "cpu"):
+        return False
+    if OCR_GPU in ("1", "true", "yes", "gpu"):
+        return True
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+class OcrEngine:
+    """
+    Экземпляр easyocr.Reader с фиксированным набором символов (allowlist).
+    Веса загружаются один раз через реестр моделей, движки с одинаковыми языками делят один Reader.
+    """
+
+    def __init__(self, model_name, langs, allowlist=None):
+        self.model_name = model_name
+        self.langs = langs
+        self.allowlist = allowlist
+
+    @property
+    def reader(self):
+        return model_registry.get(self.model_name)
+
+    def readtext(self, image, **kwargs):
+        if self.allowlist:
+            kwargs.setdefault("allowlist", self.allowlist)
+        return self.reader.readtext(image, **kwargs)
+
+    def warmup(self):
+        dummy = np.zeros((32, 128), dtype=np.uint8)
+        self.readtext(dummy)
+
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def ocr_model_name(langs):
+    return "ocr:" + "+".join(langs)
+
+
+# Регистрация easyocr.Reader для набора языков в реестре моделей
+def _register_reader(langs):
+    def load(path):
+        gpu = _use_gpu()
+        logger.info("Загрузка easyocr.Reader(%s, gpu=%s)", list(langs), gpu)
+        return easyocr.Reader(list(langs), gpu=gpu, model_storage_directory=path)
+
+    name = ocr_model_name(langs)
+    model_registry.register(name, load, OCR_MODEL_DIR)
+    return name
+
+
+# Получение OCR-движка для набора языков и allowlist (создается один раз на процесс)
+def get_ocr_engine(langs=None, allowlist=None):
+    langs = tuple(langs) if langs else OCR_LANGS
+    key = (langs, allowlist)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = OcrEngine(_register_reader(langs), langs, allowlist)
+            _engines[key] = engine
+    return engine
+
+
+# Прогрев всех созданных движков (вызывается при старте приложения)
+def warmup_ocr_engines():
+    if not _engines:
+        get_ocr_engine()
+    for engine in list(_engines.values()):
+        engine.warmup()
+    logger.info("OCR-движки прогреты: %d", len(_engines))
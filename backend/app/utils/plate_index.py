@@ -0,0 +1,322 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from app.db.models import Booking, Car
+from app.utils.booking_changes import changes_watermark, changed_bookings
+from app.utils.plates import canonical_plate, plate_distance, plate_skeleton, MIN_SKELETON_EDIT_COST
+
+logger = logging.getLogger(__name__)
+
+# Период инкрементального обновления индекса и полной перезагрузки (сек)
+GATE_INDEX_REFRESH_SECONDS = float(os.getenv("GATE_INDEX_REFRESH_SECONDS", "5"))
+GATE_INDEX_FULL_RELOAD_SECONDS = float(os.getenv("GATE_INDEX_FULL_RELOAD_SECONDS", "300"))
+# Допустимая взвешенная стоимость правок при нечетком поиске (путаница О/0 стоит 0.2, обычная замена - 1)
+PLATE_FUZZY_MAX_COST = float(os.getenv("PLATE_FUZZY_MAX_COST", "1.0"))
+# Допуск при решении на шлагбауме: только дешевые путаницы OCR, обычная правка (стоимость 1) не проходит
+GATE_MATCH_MAX_COST = float(os.getenv("GATE_MATCH_MAX_COST", "0.5"))
+
+# Число правок скелета, в пределах которого индекс находит все номера: для /gate/lookup - любая
+# стоимость меньше FUZZY_COST_LIMIT. Память индекса - C(n, FUZZY_MAX_EDITS) вариантов на номер из n символов
+FUZZY_MAX_EDITS = int(os.getenv("PLATE_LOOKUP_MAX_EDITS", "2"))
+
+
+def fuzzy_cost_limit(max_edits):
+    return round((max_edits + 1) * MIN_SKELETON_EDIT_COST, 6)
+
+
+FUZZY_COST_LIMIT = fuzzy_cost_limit(FUZZY_MAX_EDITS)
+
+
+# Все варианты строки без ровно depth символов
+def _deletions(text, depth):
+    level = {text}
+    for _ in range(min(depth, len(text))):
+        level = {variant[:i] + variant[i + 1:] for variant in level for i in range(len(variant))}
+    return level
+
+
+# Все варианты строки без не более чем depth символов
+def _deletions_upto(text, depth):
+    variants = level = {text}
+    for _ in range(min(depth, len(text))):
+        level = {variant[:i] + variant[i + 1:] for variant in level for i in range(len(variant))}
+        variants = variants | level
+    return variants
+
+
+class FuzzyPlateIndex:
+    """
+    Нечеткий поиск номеров с учетом ошибок OCR (вариант SymSpell).
+    Ключ номера сворачивается в "скелет" (О/0, В/8 - один символ). Для скелета длины n хранятся
+    только варианты без ровно k = max_edits символов: у номеров в пределах k правок есть общая
+    подпоследовательность длины n - k, и запрос находит ее, перебирая свои варианты без 0..2k символов.
+    Кандидаты проверяются взвешенным расстоянием из app.utils.plates; бюджет стоимости ограничен
+    cost_limit - дальше поиск не полон.
+    Полная перезагрузка строит словари без блокировки и подменяет их одной операцией.
+    """
+
+    def __init__(self, max_cost=PLATE_FUZZY_MAX_COST, max_edits=FUZZY_MAX_EDITS):
+        self.max_edits = max_edits
+        self.cost_limit = fuzzy_cost_limit(max_edits)
+        self.max_cost = max_cost
+        self._values = {}
+        # вариант -> ключ номера или set ключей (у большинства вариантов один номер)
+        self._variants = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._values)
+
+    @staticmethod
+    def _link(variants, variant, key):
+        current = variants.get(variant)
+        if current is None:
+            variants[variant] = key
+        elif isinstance(current, set):
+            current.add(key)
+        elif current != key:
+            variants[variant] = {current, key}
+
+    @staticmethod
+    def _unlink(variants, variant, key):
+        current = variants.get(variant)
+        if isinstance(current, set):
+            current.discard(key)
+            if len(current) == 1:
+                variants[variant] = next(iter(current))
+        elif current == key:
+            del variants[variant]
+
+    def _stored_variants(self, key):
+        return _deletions(plate_skeleton(key), self.max_edits)
+
+    def add(self, key, value=None):
+        if not key:
+            return
+        variants = self._stored_variants(key)
+        with self._lock:
+            if key not in self._values:
+                for variant in variants:
+                    self._link(self._variants, variant, key)
+            self._values[key] = value
+
+    def remove(self, key):
+        if not key:
+            return
+        variants = self._stored_variants(key)
+        with self._lock:
+            if key not in self._values:
+                return
+            del self._values[key]
+            for variant in variants:
+                self._unlink(self._variants, variant, key)
+
+    # Полная замена содержимого: items - пары (ключ, значение)
+    def reload(self, items):
+        values, variants = {}, {}
+        for key, value in items:
+            if not key:
+                continue
+            if key not in values:
+                for variant in self._stored_variants(key):
+                    self._link(variants, variant, key)
+            values[key] = value
+        with self._lock:
+            self._values, self._variants = values, variants
+            self.loaded = True
+
+    # Кандидаты [(ключ, значение, стоимость)] по возрастанию стоимости; стоимость меньше cost_limit.
+    # Под блокировкой - только обращения к словарям, расстояния считаются после нее
+    def search(self, text, max_cost=None, limit=5):
+        max_cost = self.max_cost if max_cost is None else max_cost
+        if max_cost >= self.cost_limit:
+            raise ValueError(f"max_cost must be less than {self.cost_limit}")
+        query = canonical_plate(text)
+        if not query:
+            return []
+        lookups = _deletions_upto(plate_skeleton(query), 2 * self.max_edits)
+        candidates = {}
+        with self._lock:
+            for variant in lookups:
+                found = self._variants.get(variant)
+                if isinstance(found, set):
+                    candidates.update((key, self._values[key]) for key in found)
+                elif found is not None:
+                    candidates[found] = self._values[found]
+        matches = []
+        for key, value in candidates.items():
+            cost = plate_distance(query, key, max_cost)
+            if cost <= max_cost:
+                matches.append((key, value, cost))
+        matches.sort(key=lambda match: (match[2], match[0]))
+        return matches[:limit]
+
+
+class ActivePlateIndex:
+    """
+    Индекс номеров с действующими или будущими бронированиями в памяти процесса.
+    Обновляется при создании/отмене брони, по журналу booking_changes (изменения из других процессов)
+    и периодической полной перезагрузкой; проверка на шлагбауме не ходит в БД.
+    Номера хранятся по каноническому ключу, при промахе используется нечеткий поиск.
+    Пока идет чтение из БД, локальные изменения запоминаются: отмененная бронь не возвращается
+    устаревшими строками, а созданная не теряется при подмене индекса.
+    """
+
+    def __init__(self):
+        # Решению на шлагбауме достаточно правок, укладывающихся в GATE_MATCH_MAX_COST
+        self._fuzzy = FuzzyPlateIndex(GATE_MATCH_MAX_COST, int(GATE_MATCH_MAX_COST // MIN_SKELETON_EDIT_COST))
+        self._by_plate = {}
+        self._by_booking = {}
+        # Брони, отмененные и созданные в этом процессе после начала последнего чтения из БД
+        self._removed = set()
+        self._added = {}
+        self._watermark = None
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.last_refresh = None
+        self.last_full_reload = None
+
+    def _add(self, booking_id, car_plate, start_time, end_time):
+        self._discard(booking_id)
+        plate = canonical_plate(car_plate)
+        if plate not in self._by_plate:
+            self._fuzzy.add(plate)
+        self._by_plate.setdefault(plate, {})[booking_id] = (start_time, end_time)
+        self._by_booking[booking_id] = plate
+
+    def _discard(self, booking_id):
+        plate = self._by_booking.pop(booking_id, None)
+        if plate is None:
+            return
+        bookings = self._by_plate[plate]
+        bookings.pop(booking_id)
+        if not bookings:
+            self._drop_plate(plate)
+
+    def add(self, booking):
+        if booking.end_time < datetime.now():
+            return
+        row = (booking.id, booking.car_plate, booking.start_time, booking.end_time)
+        with self._lock:
+            self._added[booking.id] = row
+            self._add(*row)
+
+    def remove(self, booking_id):
+        with self._lock:
+            self._removed.add(booking_id)
+            self._added.pop(booking_id, None)
+            self._discard(booking_id)
+
+    def _drop_plate(self, plate):
+        self._by_plate.pop(plate, None)
+        self._fuzzy.remove(plate)
+
+    # Начало чтения из БД: с этого момента локальные изменения запоминаются заново
+    def _begin_read(self):
+        with self._lock:
+            self._removed, self._added = set(), {}
+
+    def _rows(self, db):
+        return db.query(Booking.id, Booking.car_plate, Booking.start_time, Booking.end_time).filter(
+            Booking.end_time >= datetime.now()
+        ).all()
+
+    # Полная перезагрузка индекса из БД
+    def reload(self, db):
+        self._begin_read()
+        watermark = changes_watermark(db)
+        rows = self._rows(db)
+        with self._lock:
+            self._by_plate, self._by_booking = {}, {}
+            self._fuzzy.reload([])
+            for row in rows:
+                if row.id not in self._removed:
+                    self._add(*row)
+            for row in self._added.values():
+                self._add(*row)
+            self._watermark = watermark
+            self.loaded = True
+            self.last_refresh = self.last_full_reload = time.time()
+        logger.info("Индекс номеров для шлагбаума загружен: %d бронирований", len(rows))
+
+    # Инкрементальное обновление по журналу изменений бронирований.
+    # Возвращает True, если была выполнена полная перезагрузка
+    def refresh(self, db):
+        if not self.loaded or time.time() - self.last_full_reload >= GATE_INDEX_FULL_RELOAD_SECONDS:
+            self.reload(db)
+            return True
+        self._begin_read()
+        watermark = changes_watermark(db)
+        changes = changed_bookings(db, self._watermark, Booking.car_plate, Booking.start_time, Booking.end_time)
+        now = datetime.now()
+        with self._lock:
+            for booking_id, car_plate, start_time, end_time in changes:
+                if car_plate is None or end_time < now or booking_id in self._removed:
+                    self._discard(booking_id)
+                elif booking_id not in self._added:
+                    self._add(booking_id, car_plate, start_time, end_time)
+            self._prune(now)
+            self._watermark = watermark or self._watermark
+            self.last_refresh = time.time()
+        return False
+
+    def _prune(self, now):
+        expired = [
+            booking_id for plate, bookings in self._by_plate.items()
+            for booking_id, (_, end_time) in bookings.items() if end_time < now
+        ]
+        for booking_id in expired:
+            self._discard(booking_id)
+
+    def _active_booking(self, plate, at):
+        for booking_id, (start_time, end_time) in self._by_plate.get(plate, {}).items():
+            if start_time <= at <= end_time:
+                return booking_id
+        return None
+
+    # Действующее в момент at бронирование для номера: {booking_id, plate_key, cost} или None.
+    # Сначала точное совпадение канонического ключа, затем номера, отличающиеся только дешевыми
+    # путаницами OCR (стоимость не больше GATE_MATCH_MAX_COST и всегда меньше обычной замены)
+    def match(self, plate, at=None, fuzzy=True):
+        at = at or datetime.now()
+        key = canonical_plate(plate)
+        candidates = [(key, None, 0.0)]
+        if fuzzy:
+            candidates += [match for match in self._fuzzy.search(key) if match[2] < 1.0]
+        with self._lock:
+            for candidate, _, cost in candidates:
+                booking_id = self._active_booking(candidate, at)
+                if booking_id is not None:
+                    return {"booking_id": booking_id, "plate_key": candidate, "cost": cost}
+        return None
+
+    # id действующего в момент at бронирования для номера (точное совпадение ключа) или None
+    def find_booking(self, plate, at=None):
+        found = self.match(plate, at, fuzzy=False)
+        return found["booking_id"] if found else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "plates": len(self._by_plate),
+                "bookings": len(self._by_booking),
+                "registered_plates": len(registered_plate_index),
+                "last_refresh": self.last_refresh,
+                "last_full_reload": self.last_full_reload,
+            }
+
+
+# Зарегистрированные автомобили: канонический ключ -> номер в том виде, как он сохранен
+def load_registered_plates(db):
+    rows = db.query(Car.plate_key, Car.car_plate).all()
+    registered_plate_index.reload(rows)
+    logger.info("Индекс зарегистрированных номеров загружен: %d автомобилей", len(rows))
+
+
+active_plate_index = ActivePlateIndex()
+registered_plate_index = FuzzyPlateIndex()
@@ -0,0 +1,90 @@
+import os
+import re
+import threading
+
+import cv2
+
+from app.utils.ocr_engine import get_ocr_engine
+
+# Алфавит российских номеров (как ru_car_plate_pattern в telegram/users_bot/common/base.py, в верхнем регистре)
+PLATE_LETTERS = "АВЕКМНОРСТУХ"
+PLATE_ALLOWLIST = PLATE_LETTERS + "0123456789"
+ru_plate_pattern = re.compile(r'^[АВЕКМНОРСТУХ]\d{3}[АВЕКМНОРСТУХ]{2}\d{2,3}$')
+
+# Высота кропа для быстрого пути и минимальная уверенность, при которой полный OCR не запускается
+OCR_FAST_HEIGHT = int(os.getenv("OCR_FAST_HEIGHT", "64"))
+OCR_FAST_MIN_CONFIDENCE = float(os.getenv("OCR_FAST_MIN_CONFIDENCE", "0.6"))
+
+FAST_PATH = "fast"
+FALLBACK_PATH = "fallback"
+
+
+# Склейка фрагментов easyocr слева направо в одну строку номера
+def join_detections(results):
+    if not results:
+        return None, None
+    results = sorted(results, key=lambda detection: min(point[0] for point in detection[0]))
+    text = "".join(str(text) for _, text, _ in results).upper().replace(" ", "")
+    score = min(float(score) for _, _, score in results)
+    return text, score
+
+
+def is_valid_plate(text):
+    return bool(text) and ru_plate_pattern.match(text) is not None
+
+
+class CascadeRecognizer:
+    """
+    Каскадное распознавание номера: сначала easyocr с allowlist алфавита номеров
+    на кропе фиксированной высоты, проверка по шаблону номера; полный easyocr -
+    только при низкой уверенности или несовпадении с шаблоном.
+    """
+
+    def __init__(self, fast_height=OCR_FAST_HEIGHT, min_confidence=OCR_FAST_MIN_CONFIDENCE):
+        self.fast_height = fast_height
+        self.min_confidence = min_confidence
+        self.fast_engine = get_ocr_engine(allowlist=PLATE_ALLOWLIST)
+        self.full_engine = get_ocr_engine()
+
+    def _resize(self, image):
+        h, w = image.shape[:2]
+        if h == 0 or w == 0 or h == self.fast_height:
+            return image
+        width = max(1, int(round(w * self.fast_height / h)))
+        interpolation = cv2.INTER_AREA if h > self.fast_height else cv2.INTER_CUBIC
+        return cv2.resize(image, (width, self.fast_height), interpolation=interpolation)
+
+    # Возвращает (текст, уверенность, путь каскада)
+    def recognize(self, image):
+        text, score = join_detections(self.fast_engine.readtext(self._resize(image)))
+        if is_valid_plate(text) and score >= self.min_confidence:
+            return text, score, FAST_PATH
+
+        full_text, full_score = join_detections(self.full_engine.readtext(image))
+        if full_text is None:
+            return text, score, FALLBACK_PATH
+        return full_text, full_score, FALLBACK_PATH
+
+
+class PathStats:
+    """
+    Счетчики путей каскада: сколько номеров распознано каждым путем и их доля.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {path: {"count": 0, "recognized": 0} for path in (FAST_PATH, FALLBACK_PATH)}
+
+    def observe(self, path, recognized=True):
+        with self._lock:
+            entry = self._paths[path]
+            entry["count"] += 1
+            entry["recognized"] += int(recognized)
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(entry["count"] for entry in self._paths.values())
+            return {
+                path: {**entry, "rate": entry["count"] / total if total else 0.0}
+                for path, entry in self._paths.items()
+            }
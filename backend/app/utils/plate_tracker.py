@@ -0,0 +1,175 @@
+import heapq
+import itertools
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+
+def _iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+# Качество кропа номера: уверенность детектора, резкость (дисперсия лапласиана) и размер
+def crop_quality(crop, score):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(score) * np.log1p(sharpness) * np.sqrt(gray.shape[0] * gray.shape[1])
+
+
+# Посимвольное голосование по нескольким прочтениям номера с весами-уверенностями
+def vote_plate(readings):
+    readings = [(text, float(conf)) for text, conf in readings if text]
+    if not readings:
+        return None, None
+
+    by_length = defaultdict(float)
+    for text, conf in readings:
+        by_length[len(text)] += conf
+    length = max(by_length, key=by_length.get)
+    same_length = [(text, conf) for text, conf in readings if len(text) == length]
+
+    chars, agreement = [], []
+    for position in range(length):
+        votes = defaultdict(float)
+        for text, conf in same_length:
+            votes[text[position]] += conf
+        char = max(votes, key=votes.get)
+        chars.append(char)
+        agreement.append(votes[char] / sum(votes.values()))
+
+    mean_conf = sum(conf for _, conf in same_length) / len(same_length)
+    return "".join(chars), mean_conf * float(np.mean(agreement))
+
+
+class Track:
+    def __init__(self, track_id, bbox, frame_index):
+        self.id = track_id
+        self.bbox = bbox
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 0
+        self.missed = 0
+        self.best_crops = []
+        self._counter = itertools.count()
+
+    def add_crop(self, crop, score, limit):
+        item = (crop_quality(crop, score), next(self._counter), crop, score)
+        if len(self.best_crops) < limit:
+            heapq.heappush(self.best_crops, item)
+        elif item[0] > self.best_crops[0][0]:
+            heapq.heapreplace(self.best_crops, item)
+
+
+class PlateTracker:
+    """
+    Связывает боксы номеров между кадрами (IoU, при неудаче - близость центров),
+    хранит для каждого трека лучшие кропы и по завершении трека распознает только их,
+    объединяя прочтения посимвольным голосованием.
+    """
+
+    def __init__(self, recognize_crop=None, iou_threshold=0.3, max_missed=3, best_crops=3, min_hits=2):
+        self.recognize_crop = recognize_crop or _recognize_crop
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.best_crops = best_crops
+        self.min_hits = min_hits
+        self.tracks = []
+        self.ocr_calls = 0
+        self._ids = itertools.count(1)
+
+    def _match(self, bboxes):
+        if not self.tracks or not bboxes:
+            return {}
+        track_boxes = np.array([t.bbox[:4] for t in self.tracks], dtype=np.float32)
+        det_boxes = np.array([b[:4] for b in bboxes], dtype=np.float32)
+        iou = _iou_matrix(track_boxes, det_boxes)
+
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        det_centers = (det_boxes[:, :2] + det_boxes[:, 2:]) / 2
+        distance = np.linalg.norm(track_centers[:, None] - det_centers[None], axis=2)
+        track_size = np.maximum(np.maximum(track_boxes[:, 2] - track_boxes[:, 0], track_boxes[:, 3] - track_boxes[:, 1]), 1.0)
+        near = distance <= track_size[:, None]
+        # Основной критерий - IoU, близость центров используется при быстром движении
+        cost = np.where(iou >= self.iou_threshold, 2.0 - iou, np.where(near, 2.0 + distance / track_size[:, None], np.inf))
+
+        matches = {}
+        for flat in np.argsort(cost, axis=None):
+            t, d = (int(i) for i in np.unravel_index(flat, cost.shape))
+            if not np.isfinite(cost[t, d]):
+                break
+            if t in matches or d in matches.values():
+                continue
+            matches[t] = d
+        return matches
+
+    # Обновление треков детекциями кадра; возвращает номера завершенных треков
+    def update(self, frame, bboxes, frame_index):
+        bboxes = list(bboxes)
+        matches = self._match(bboxes)
+        matched = set(matches.values())
+
+        for t, track in enumerate(self.tracks):
+            if t in matches:
+                self._observe(track, frame, bboxes[matches[t]], frame_index)
+            else:
+                track.missed += 1
+        for d, bbox in enumerate(bboxes):
+            if d not in matched:
+                track = Track(next(self._ids), bbox, frame_index)
+                self._observe(track, frame, bbox, frame_index)
+                self.tracks.append(track)
+
+        finished = [t for t in self.tracks if t.missed > self.max_missed]
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return [plate for plate in map(self._finalize, finished) if plate is not None]
+
+    # Завершение всех активных треков (конец потока)
+    def flush(self):
+        finished, self.tracks = self.tracks, []
+        return [plate for plate in map(self._finalize, finished) if plate is not None]
+
+    def _observe(self, track, frame, bbox, frame_index):
+        x1, y1, x2, y2, score = bbox
+        track.bbox = bbox
+        track.last_frame = frame_index
+        track.hits += 1
+        track.missed = 0
+        crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+        if crop.size:
+            track.add_crop(crop.copy(), score, self.best_crops)
+
+    def _finalize(self, track):
+        if track.hits < self.min_hits or not track.best_crops:
+            return None
+        readings = []
+        for _, _, crop, _ in sorted(track.best_crops, reverse=True):
+            self.ocr_calls += 1
+            readings.append(self.recognize_crop(crop))
+        text, confidence = vote_plate(readings)
+        if text is None:
+            return None
+        return {
+            "track_id": track.id,
+            "license_plate": text,
+            "confidence": confidence,
+            "bbox_2d": list(track.bbox[:4]),
+            "first_frame": track.first_frame,
+            "last_frame": track.last_frame,
+            "frames": track.hits,
+            "ocr_calls": len(readings),
+        }
+
+
+# OCR кропа номера через preprocess_license_plate и recognize_text из ml_controller
+def _recognize_crop(crop):
+    from app.controllers.ml_controller import preprocess_license_plate, recognize_text
+    h, w = crop.shape[:2]
+    return recognize_text(preprocess_license_plate(crop, (0, 0, w, h, 1.0)))
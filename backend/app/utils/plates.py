@@ -0,0 +1,67 @@
+# Латинские буквы, совпадающие по начертанию с буквами российских номеров
+LATIN_TO_CYRILLIC = str.maketrans("ABEKMHOPCTYX", "АВЕКМНОРСТУХ")
+
+# Пары символов, которые OCR путает, и стоимость их замены (обычная замена стоит 1)
+CONFUSION_COSTS = {
+    ("О", "0"): 0.2,
+    ("В", "8"): 0.3,
+    ("Т", "7"): 0.4,
+    ("А", "4"): 0.5,
+    ("С", "О"): 0.5,
+    ("Н", "М"): 0.5,
+    ("К", "Х"): 0.5,
+    ("Р", "В"): 0.6,
+    ("У", "4"): 0.6,
+    ("1", "7"): 0.5,
+    ("6", "8"): 0.5,
+    ("3", "8"): 0.5,
+    ("5", "6"): 0.6,
+}
+_COSTS = {}
+for (a, b), cost in CONFUSION_COSTS.items():
+    _COSTS[(a, b)] = _COSTS[(b, a)] = cost
+
+# Самые частые путаницы сворачиваются в один символ "скелета" для точного поиска
+_SKELETON = str.maketrans({"О": "0", "В": "8"})
+
+
+# Канонический ключ номера: верхний регистр, кириллица вместо латинских двойников, без пробелов и дефисов
+def canonical_plate(text):
+    if text is None:
+        return None
+    return "".join(ch for ch in str(text).upper().translate(LATIN_TO_CYRILLIC) if ch.isalnum())
+
+
+def plate_skeleton(key):
+    return key.translate(_SKELETON)
+
+
+# Минимальная стоимость правки, меняющей скелет: стоимость d не больше d / MIN_SKELETON_EDIT_COST правок скелета
+MIN_SKELETON_EDIT_COST = min(
+    [cost for (a, b), cost in CONFUSION_COSTS.items() if plate_skeleton(a) != plate_skeleton(b)] + [1.0]
+)
+
+
+def substitution_cost(a, b):
+    if a == b:
+        return 0.0
+    return _COSTS.get((a, b), 1.0)
+
+
+# Взвешенное расстояние Левенштейна с ранним выходом при превышении max_cost
+def plate_distance(a, b, max_cost=float("inf")):
+    if abs(len(a) - len(b)) > max_cost:
+        return float("inf")
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)] + [0.0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1.0,
+                current[j - 1] + 1.0,
+                previous[j - 1] + substitution_cost(ca, cb),
+            )
+        if min(current) > max_cost:
+            return float("inf")
+        previous = current
+    return previous[-1]
@@ -0,0 +1,189 @@
+"""
+Нагрузочная проверка бронирования при конкуренции: тысячи параллельных бронирований нескольких мест
+в пересекающихся окнах через обработчик /booking/reserve-parking.
+После прогона проверяется, что ни у одного места нет пересекающихся бронирований и что ни одна
+отклоненная попытка (400 или 409) не приходилась на окно, оставшееся свободным: брони в прогоне
+только добавляются, поэтому такой отказ - ложный. Выводится число бронирований в секунду.
+При двойном бронировании или ложных отказах завершается с ошибкой.
+
+Примеры:
+    python -m app.utils.reservation_stress --seed --spots 5 --requests 5000 --concurrency 64
+    DATABASE_URL=sqlite:///./stress.db python -m app.utils.reservation_stress --seed
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+
+from app.db.database import SessionLocal, AsyncSessionLocal, async_engine, init_db
+from app.db.models import Resident, Car, ParkingSpot, Booking
+from app.utils.db_benchmark import percentiles
+
+logger = logging.getLogger(__name__)
+
+STRESS_TG_ID = 9_100_000_000
+STRESS_CAR_PLATE = "stress000"
+STRESS_SPOT_PREFIX = "stress-"
+
+
+def seed(spots):
+    db = SessionLocal()
+    try:
+        resident = db.query(Resident).filter(Resident.tg_id == STRESS_TG_ID).first()
+        if not resident:
+            resident = Resident(tg_id=STRESS_TG_ID, name="stress")
+            db.add(resident)
+            db.commit()
+        if not db.query(Car).filter(Car.car_plate == STRESS_CAR_PLATE).count():
+            db.add(Car(car_plate=STRESS_CAR_PLATE, owner_id=resident.id))
+        existing = db.query(ParkingSpot).filter(ParkingSpot.parking_spot_number.like(f"{STRESS_SPOT_PREFIX}%")).count()
+        if existing < spots:
+            db.add_all(ParkingSpot(parking_spot_number=f"{STRESS_SPOT_PREFIX}{i}", description="stress test",
+                                   is_reserved=False) for i in range(existing, spots))
+        db.commit()
+    finally:
+        db.close()
+
+
+# id тестовых мест; бронирования этих мест от прошлых прогонов удаляются
+async def prepare_spots(spots):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ParkingSpot.id).where(ParkingSpot.parking_spot_number.like(f"{STRESS_SPOT_PREFIX}%"))
+            .order_by(ParkingSpot.id).limit(spots)
+        )
+        spot_ids = result.scalars().all()
+        await db.execute(delete(Booking).where(Booking.spot_id.in_(spot_ids)))
+        await db.commit()
+    return spot_ids
+
+
+async def load_bookings(spot_ids):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Booking.id, Booking.spot_id, Booking.start_time, Booking.end_time)
+            .where(Booking.spot_id.in_(spot_ids)).order_by(Booking.spot_id, Booking.start_time)
+        )
+        rows = result.all()
+    by_spot = defaultdict(list)
+    for row in rows:
+        by_spot[row.spot_id].append(row)
+    return by_spot
+
+
+# Пересекающиеся бронирования каждого места: пары (id, id) соседних по началу интервалов
+def find_overlaps(by_spot):
+    overlaps = []
+    for bookings in by_spot.values():
+        latest = None
+        for row in bookings:
+            if latest is not None and row.start_time < latest.end_time:
+                overlaps.append({"spot_id": row.spot_id, "booking_ids": [latest.id, row.id]})
+            if latest is None or row.end_time > latest.end_time:
+                latest = row
+    return overlaps
+
+
+# Отклоненные попытки, окно которых после прогона свободно: (место, начало, конец, код ответа)
+def find_spurious_rejections(by_spot, rejected):
+    return [
+        {"spot_id": spot_id, "start_time": start, "end_time": end, "status_code": status_code}
+        for spot_id, start, end, status_code in rejected
+        if not any(row.start_time < end and row.end_time > start for row in by_spot.get(spot_id, ()))
+    ]
+
+
+async def run(spots, requests, concurrency, slots, max_length):
+    from app.controllers import booking_controller
+
+    spot_ids = await prepare_spots(spots)
+    if not spot_ids:
+        raise SystemExit("Нет тестовых мест: запустите с --seed")
+
+    # Окна в далеком будущем из сетки часовых слотов: разные длины дают частичные пересечения
+    base = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=730)
+    outcomes, latencies, rejected = Counter(), [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def reserve(i):
+        rng = random.Random(i)
+        start = base + timedelta(hours=rng.randrange(slots))
+        end = start + timedelta(hours=rng.randint(1, max_length))
+        spot_id = rng.choice(spot_ids)
+        async with semaphore:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                try:
+                    await booking_controller.reserve_parking(
+                        STRESS_TG_ID, spot_id, STRESS_CAR_PLATE, start.timestamp(), end.timestamp(), db=db
+                    )
+                    outcomes["booked"] += 1
+                except HTTPException as e:
+                    outcomes["busy" if e.status_code == 409 else "unavailable"] += 1
+                    rejected.append((spot_id, start, end, e.status_code))
+                except Exception:
+                    logger.exception("Ошибка бронирования")
+                    outcomes["errors"] += 1
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(reserve(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    by_spot = await load_bookings(spot_ids)
+    await async_engine.dispose()
+    overlaps = find_overlaps(by_spot)
+    spurious = find_spurious_rejections(by_spot, rejected)
+    return {
+        "spots": len(spot_ids),
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "attempts_per_s": requests / elapsed if elapsed else None,
+        "reservations_per_s": outcomes["booked"] / elapsed if elapsed else None,
+        "outcomes": dict(outcomes),
+        "stored_bookings": sum(len(rows) for rows in by_spot.values()),
+        "latency_ms": percentiles(latencies),
+        "overlaps": overlaps,
+        "spurious_rejections": spurious,
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка бронирования мест при конкуренции")
+    parser.add_argument("--spots", type=int, default=5, help="число бронируемых мест")
+    parser.add_argument("--requests", type=int, default=5000, help="число попыток бронирования")
+    parser.add_argument("--concurrency", type=int, default=64, help="одновременных попыток")
+    parser.add_argument("--slots", type=int, default=48, help="часовых слотов, в которых начинаются окна")
+    parser.add_argument("--max-length", type=int, default=3, help="максимальная длина окна в часах")
+    parser.add_argument("--seed", action="store_true", help="создать таблицы и тестовые данные")
+    args = parser.parse_args()
+
+    if args.seed:
+        init_db()
+        seed(args.spots)
+
+    report = asyncio.run(run(args.spots, args.requests, args.concurrency, args.slots, args.max_length))
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    logger.info("%d бронирований из %d попыток за %.1f с: %.1f брон./с, %.1f попыток/с",
+                report["outcomes"].get("booked", 0), args.requests, report["elapsed_s"],
+                report["reservations_per_s"], report["attempts_per_s"])
+    if report["overlaps"]:
+        logger.error("Двойные бронирования: %d", len(report["overlaps"]))
+    if report["spurious_rejections"]:
+        logger.error("Отказы при свободном окне: %d", len(report["spurious_rejections"]))
+    if report["overlaps"] or report["spurious_rejections"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
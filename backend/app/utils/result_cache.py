@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Размер кэша, время жизни записи (сек) и допустимое расстояние Хэмминга между хэшами кадров
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "10"))
+RESULT_CACHE_MAX_DISTANCE = int(os.getenv("RESULT_CACHE_MAX_DISTANCE", "4"))
+
+
+# Разностный перцептивный хэш (dHash) уменьшенного кадра: hash_size * hash_size бит
+def dhash(image, hash_size=8):
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class PerceptualCache:
+    """
+    LRU-кэш результатов распознавания с TTL. Ключ - перцептивный хэш кадра и версия модели;
+    почти одинаковые кадры (расстояние Хэмминга <= max_distance) считаются попаданием.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, max_distance=RESULT_CACHE_MAX_DISTANCE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        expired = [key for key, (_, expires) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+    def get(self, frame_hash, version):
+        now = time.monotonic()
+        with self._lock:
+            key = (version, frame_hash)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if self.max_distance > 0:
+                best_key, best_distance = None, self.max_distance + 1
+                for (entry_version, entry_hash), (_, expires) in self._entries.items():
+                    if entry_version != version or expires <= now:
+                        continue
+                    distance = (entry_hash ^ frame_hash).bit_count()
+                    if distance < best_distance:
+                        best_key, best_distance = (entry_version, entry_hash), distance
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.near_hits += 1
+                    return self._entries[best_key][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, frame_hash, version, result):
+        now = time.monotonic()
+        with self._lock:
+            key = (version, frame_hash)
+            self._entries[key] = (result, now + self.ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._evict_expired(now)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
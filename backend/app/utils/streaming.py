@@ -0,0 +1,39 @@
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.db.database import AsyncSessionLocal
+from app.utils.async_database_utils import MAX_PAGE_SIZE
+
+# Размер порции ответа: строки NDJSON копятся до этого размера перед отправкой клиенту
+STREAM_FLUSH_BYTES = 64 * 1024
+
+
+async def ndjson_chunks(rows, flush_bytes=STREAM_FLUSH_BYTES):
+    buffer, size = [], 0
+    async for row in rows:
+        line = json.dumps(row, ensure_ascii=False, default=str) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= flush_bytes:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+# Потоковый ответ NDJSON по асинхронному генератору строк stream_rows(db, *args).
+# Сессия открывается внутри генератора: сессия из Depends(get_db) закрывается до отправки тела ответа
+def ndjson_response(stream_rows, *args, headers=None):
+    async def body():
+        async with AsyncSessionLocal() as db:
+            async for chunk in ndjson_chunks(stream_rows(db, *args)):
+                yield chunk
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
+
+
+def check_page_limit(limit):
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
@@ -0,0 +1,208 @@
+"""
+Обработка видеопотока (файл или RTSP) для автоматического управления шлагбаумом.
+Детектор YOLO запускается только при движении в зоне интереса (ROI),
+события с распознанными номерами отправляются в callback и очередь.
+
+Пример:
+    python -m app.utils.video_stream rtsp://camera/stream --roi 0.2,0.4,0.8,1.0
+"""
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+
+import cv2
+
+from app.utils.plate_tracker import PlateTracker
+
+logger = logging.getLogger(__name__)
+
+
+# ROI в долях кадра "x1,y1,x2,y2" -> кортеж float
+def parse_roi(value):
+    if not value:
+        return None
+    roi = tuple(float(v) for v in value.split(","))
+    if len(roi) != 4 or not all(0.0 <= v <= 1.0 for v in roi) or roi[0] >= roi[2] or roi[1] >= roi[3]:
+        raise ValueError(f"Invalid ROI: {value}")
+    return roi
+
+
+def roi_slice(shape, roi):
+    h, w = shape[:2]
+    if roi is None:
+        return slice(0, h), slice(0, w)
+    x1, y1, x2, y2 = roi
+    return slice(int(y1 * h), int(y2 * h)), slice(int(x1 * w), int(x2 * w))
+
+
+class MotionDetector:
+    """
+    Дешевая детекция движения разностью соседних кадров на уменьшенном сером изображении.
+    """
+
+    def __init__(self, roi=None, pixel_threshold=25, min_area_ratio=0.01, width=320):
+        self.roi = roi
+        self.pixel_threshold = pixel_threshold
+        self.min_area_ratio = min_area_ratio
+        self.width = width
+        self._previous = None
+
+    def update(self, frame):
+        rows, cols = roi_slice(frame.shape, self.roi)
+        region = frame[rows, cols]
+        scale = self.width / max(region.shape[1], 1)
+        if scale < 1.0:
+            region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return True
+        diff = cv2.absdiff(gray, previous)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+        return changed >= self.min_area_ratio * gray.size
+
+
+# Детекция всех номеров на кадре (без OCR) для режима с трекингом
+def detect_frame(frame):
+    from app.controllers.ml_controller import detect_license_plates, get_detector
+    return detect_license_plates(frame, get_detector())
+
+
+# Распознавание всех номеров на кадре через пайплайн ml_controller
+def recognize_frame(frame):
+    from app.controllers.ml_controller import recognition_response
+    response = recognition_response(frame, detect_frame(frame))
+    return [plate for plate in response.get("plates", []) if plate["license_plate"] is not None]
+
+
+class StreamProcessor:
+    """
+    Читает кадры из источника, проверяет движение на каждом sample_every-м кадре
+    (idle_sample_every-м, пока в кадре ничего не происходит) и запускает распознавание
+    только при движении. Непрореженные кадры пропускаются через grab() без декодирования в BGR.
+    С трекером (PlateTracker) на кадрах выполняется только детекция, а OCR - один раз на машину
+    по лучшим кропам трека.
+    """
+
+    def __init__(self, source, on_event=None, roi=None, sample_every=5, idle_sample_every=15,
+                 idle_after=10, motion=None, recognize=recognize_frame, realtime=None,
+                 tracker=None, detect=detect_frame):
+        self.source = source
+        self.on_event = on_event
+        self.events = queue.Queue(maxsize=1000)
+        self.sample_every = max(1, sample_every)
+        self.idle_sample_every = max(self.sample_every, idle_sample_every)
+        self.idle_after = idle_after
+        self.motion = motion or MotionDetector(roi=roi)
+        self.recognize = recognize
+        self.tracker = tracker
+        self.detect = detect
+        # Метки времени событий: время получения кадра для потоков, позиция в файле для видео
+        self.realtime = realtime
+        self.frames = 0
+        self.sampled = 0
+        self.recognitions = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            logger.warning("Очередь событий потока %s переполнена", self.source)
+
+    def process_frame(self, frame, frame_index, timestamp):
+        if not self.motion.update(frame):
+            if self.tracker is not None:
+                self._emit_plates(self.tracker.update(frame, [], frame_index), frame_index, timestamp)
+            return False
+        self.recognitions += 1
+        if self.tracker is None:
+            plates = self.recognize(frame)
+        else:
+            plates = self.tracker.update(frame, self.detect(frame), frame_index)
+        self._emit_plates(plates, frame_index, timestamp)
+        return True
+
+    def _emit_plates(self, plates, frame_index, timestamp):
+        for plate in plates:
+            self._emit({"source": str(self.source), "frame": frame_index, "timestamp": timestamp, **plate})
+
+    def run(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise RuntimeError(f"Cannot open video source: {self.source}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        still_samples = 0
+        try:
+            while not self._stop.is_set():
+                if not capture.grab():
+                    break
+                self.frames += 1
+                step = self.idle_sample_every if still_samples >= self.idle_after else self.sample_every
+                if self.frames % step:
+                    continue
+                ok, frame = capture.retrieve()
+                if not ok:
+                    continue
+                self.sampled += 1
+                timestamp = time.time() if self.realtime else self.frames / fps
+                moved = self.process_frame(frame, self.frames, timestamp)
+                still_samples = 0 if moved else still_samples + 1
+            if self.tracker is not None:
+                self._emit_plates(self.tracker.flush(), self.frames, time.time() if self.realtime else self.frames / fps)
+        finally:
+            capture.release()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"stream-{self.source}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "source": str(self.source),
+            "frames": self.frames,
+            "sampled": self.sampled,
+            "recognitions": self.recognitions,
+            "ocr_calls": self.tracker.ocr_calls if self.tracker is not None else self.recognitions,
+        }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Распознавание номеров в видеопотоке")
+    parser.add_argument("source", help="путь к видеофайлу или RTSP URL")
+    parser.add_argument("--roi", type=parse_roi, help="зона интереса x1,y1,x2,y2 в долях кадра")
+    parser.add_argument("--sample-every", type=int, default=5)
+    parser.add_argument("--idle-sample-every", type=int, default=15)
+    parser.add_argument("--track", action="store_true", help="трекинг номеров и голосование OCR по кадрам")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    processor = StreamProcessor(
+        source,
+        on_event=lambda event: print(json.dumps(event, ensure_ascii=False), flush=True),
+        roi=args.roi,
+        sample_every=args.sample_every,
+        idle_sample_every=args.idle_sample_every,
+        realtime=not isinstance(source, str) or "://" in source,
+        tracker=PlateTracker() if args.track else None,
+    )
+    processor.run()
+    logger.info("Поток завершен: %s", processor.stats())
+
+
+if __name__ == "__main__":
+    main()
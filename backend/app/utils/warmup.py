@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз прогонять каждую модель на пустых данных (первые вызовы torch самые медленные)
+ML_WARMUP_RUNS = int(os.getenv("ML_WARMUP_RUNS", "2"))
+# Сколько ждать прогрева всех процессов пула (сек)
+ML_WARMUP_TIMEOUT = float(os.getenv("ML_WARMUP_TIMEOUT", "600"))
+
+# Отчет о прогреве моделей в текущем процессе
+_report = None
+
+
+def _timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return timings
+
+
+# Загрузка и прогон всех моделей процесса на пустых данных: детектор и оба пути каскада OCR
+def warmup_models(runs=ML_WARMUP_RUNS):
+    global _report
+    from app.controllers.ml_controller import detect_license_plates_batch, get_detector, models_info, plate_recognizer
+    from app.utils.ocr_engine import warmup_ocr_engines
+
+    started = time.perf_counter()
+    stages = {}
+
+    start = time.perf_counter()
+    detector = get_detector()
+    warmup_ocr_engines()
+    stages["load_ms"] = (time.perf_counter() - start) * 1000.0
+
+    frame = np.zeros((640, 640, 3), dtype=np.uint8)
+    stages["detect_ms"] = _timed(lambda: detect_license_plates_batch([frame], detector), max(1, runs))
+    crop = np.full((64, 256), 255, dtype=np.uint8)
+    stages["fast_ocr_ms"] = _timed(lambda: plate_recognizer.fast_engine.readtext(crop), max(1, runs))
+    stages["full_ocr_ms"] = _timed(lambda: plate_recognizer.full_engine.readtext(crop), max(1, runs))
+
+    _report = {
+        "pid": os.getpid(),
+        "total_ms": (time.perf_counter() - started) * 1000.0,
+        "stages": stages,
+        "models": models_info(),
+        "finished_at": time.time(),
+    }
+    logger.info("Модели прогреты за %.0f мс (pid %d)", _report["total_ms"], _report["pid"])
+    return _report
+
+
+def warmup_report():
+    return _report
+
+
+class WarmupTracker:
+    """
+    Прогрев моделей после старта приложения и его состояние для /health/ready.
+    В режиме пула процессов прогрев выполняет каждый процесс при запуске,
+    трекер собирает отчеты, пока не ответят все процессы.
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.started_at = None
+        self.finished_at = None
+        self.reports = {}
+        self.error = None
+
+    @property
+    def ready(self):
+        return self.status == "done"
+
+    async def run(self, pool, timeout=ML_WARMUP_TIMEOUT):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            await asyncio.wait_for(self._collect(pool), timeout)
+            self.status = "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = repr(e)
+            logger.exception("Ошибка прогрева моделей")
+        finally:
+            self.finished_at = time.time()
+
+    async def _collect(self, pool):
+        if pool.workers <= 0:
+            loop = asyncio.get_running_loop()
+            report = await loop.run_in_executor(None, warmup_models)
+            self.reports[report["pid"]] = report
+            return
+        # Задачи попадают к любому свободному процессу: опрашиваем, пока не ответят все
+        while len(self.reports) < pool.workers:
+            reports = await asyncio.gather(
+                *(pool.call(warmup_report) for _ in range(pool.workers)), return_exceptions=True
+            )
+            for report in reports:
+                # Таймаут вызова: процесс еще загружает модели, опросим его в следующем раунде
+                if isinstance(report, asyncio.TimeoutError):
+                    continue
+                if isinstance(report, BaseException):
+                    raise report
+                if report is not None:
+                    self.reports[report["pid"]] = report
+            if len(self.reports) < pool.workers:
+                await asyncio.sleep(0.5)
+
+    # Перезапуск пула (горячая замена весов): процессы прогреваются заново
+    def reset(self):
+        self.status = "pending"
+        self.reports = {}
+        self.error = None
+
+    def snapshot(self):
+        return {
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_s": (self.finished_at - self.started_at) if self.finished_at and self.started_at else None,
+            "workers": list(self.reports.values()),
+            "error": self.error,
+        }
+
+
+warmup_tracker = WarmupTracker()
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Тесты запускаются из каталога backend или корня репозитория: пакет app должен импортироваться
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Тестовая БД задается до импорта app.db.database: по умолчанию файл SQLite, общий для синхронного
+# и асинхронного движка. DATABASE_URL окружения не используется - таблицы очищаются после каждого теста
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="parking-tests-"), "test.db")
+)
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+
+@pytest.fixture
+def db():
+    pytest.importorskip("sqlalchemy")
+    from app.db.database import Base, SessionLocal, engine, init_db
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
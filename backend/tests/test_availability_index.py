@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.db.models import Booking, ParkingSpot  # noqa: E402
+from app.utils import availability_index as availability  # noqa: E402
+from app.utils.availability_index import AvailabilityIndex, SpotIntervals  # noqa: E402
+
+
+def test_spot_intervals_handle_overlapping_bookings():
+    intervals = SpotIntervals()
+    intervals.add(1, 0, 100)
+    intervals.add(2, 10, 20)
+    # Окно внутри длинной брони после короткой: концы не отсортированы
+    assert not intervals.is_free(50, 60)
+    assert intervals.is_free(100, 110)
+    intervals.remove(1, 0)
+    assert intervals.is_free(50, 60)
+    assert not intervals.is_free(15, 16)
+    assert intervals.prune(200) == [2]
+    assert len(intervals) == 0
+
+
+@pytest.fixture
+def window():
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    return start, start + timedelta(hours=1)
+
+
+def _book(db, booking_id, spot_id, window):
+    db.add(Booking(id=booking_id, resident_id=1, spot_id=spot_id, car_plate="А123ВС77",
+                   start_time=window[0], end_time=window[1]))
+    db.commit()
+
+
+def _free_ids(index, window):
+    return [spot.id for spot in index.free_spots(*window)]
+
+
+def test_refresh_sees_changes_from_other_processes(db, window):
+    db.add_all(ParkingSpot(id=i, parking_spot_number=f"A-{i}") for i in (1, 2, 3))
+    db.commit()
+    _book(db, 10, 1, window)
+    index = AvailabilityIndex()
+    index.refresh(db)
+    assert _free_ids(index, window) == [2, 3]
+    # Бронь с меньшим id, зафиксированная позже, отмена и удаленное место - из другого процесса
+    _book(db, 5, 2, window)
+    db.query(Booking).filter(Booking.id == 10).delete()
+    db.query(ParkingSpot).filter(ParkingSpot.id == 3).delete()
+    db.commit()
+    index.refresh(db)
+    assert _free_ids(index, window) == [1]
+
+
+def test_refresh_does_not_restore_booking_cancelled_during_read(db, window, monkeypatch):
+    db.add(ParkingSpot(id=1, parking_spot_number="A-1"))
+    db.commit()
+    index = AvailabilityIndex()
+    index.refresh(db)
+    _book(db, 1, 1, window)
+    read = availability.changed_bookings
+
+    def read_then_cancel(*args):
+        rows = read(*args)
+        index.remove(1)
+        return rows
+
+    monkeypatch.setattr(availability, "changed_bookings", read_then_cancel)
+    index.refresh(db)
+    assert _free_ids(index, window) == [1]
+
+
+def test_reload_keeps_booking_created_during_read(db, window, monkeypatch):
+    db.add(ParkingSpot(id=1, parking_spot_number="A-1"))
+    db.commit()
+    index = AvailabilityIndex()
+    read = index._booking_rows
+
+    def read_then_book(session):
+        rows = read(session)
+        index.add(SimpleNamespace(id=7, spot_id=1, start_time=window[0], end_time=window[1]))
+        return rows
+
+    monkeypatch.setattr(index, "_booking_rows", read_then_book)
+    index.reload(db)
+    assert _free_ids(index, window) == []
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from app.utils import benchmark  # noqa: E402
+from app.utils.detector_backends import DETECTOR_PATH  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not os.path.exists(DETECTOR_PATH), reason="нет весов детектора")
+
+
+# Пробный прогон: параллельная конфигурация (отдельные процессы) и последовательная отрабатывают целиком
+@pytest.mark.parametrize("concurrency", [1, 2])
+def test_run_config_smoke(concurrency):
+    samples = benchmark.load_samples(synthetic=2)
+    result = benchmark.run_config(samples, concurrency=concurrency, batch_size=1, requests=4)
+    assert result["mode"] == ("processes" if concurrency > 1 else "in_process")
+    assert result["latency_ms"]["count"] == 4
+    assert result["stages_ms"]["detect"]["count"] == 4
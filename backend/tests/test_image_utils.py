@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.utils.image_utils import decode_upload_image, image_size  # noqa: E402
+
+
+def _encode(ext, width, height):
+    ok, buffer = cv2.imencode(ext, np.zeros((height, width, 3), dtype=np.uint8))
+    assert ok
+    return buffer.tobytes()
+
+
+@pytest.mark.parametrize("ext", [".png", ".jpg"])
+def test_image_size_reads_header(ext):
+    assert tuple(image_size(_encode(ext, 37, 21))) == (37, 21)
+
+
+@pytest.mark.parametrize("ext", [".png", ".jpg", ".bmp"])
+def test_decode_rejects_images_over_pixel_limit(ext):
+    data = _encode(ext, 40, 30)
+    assert decode_upload_image(data, max_pixels=1200).shape == (30, 40, 3)
+    with pytest.raises(HTTPException) as error:
+        decode_upload_image(data, max_pixels=1199)
+    assert error.value.status_code == 413
+
+
+def test_png_header_is_checked_before_decoding():
+    # Заголовок PNG 100000x100000 без данных: 413 без попытки выделить память под кадр
+    data = _encode(".png", 1, 1)
+    data = data[:16] + (100_000).to_bytes(4, "big") * 2 + data[24:]
+    with pytest.raises(HTTPException) as error:
+        decode_upload_image(data)
+    assert error.value.status_code == 413
+
+
+def test_decode_rejects_non_images():
+    with pytest.raises(HTTPException) as error:
+        decode_upload_image(b"not an image")
+    assert error.value.status_code == 400
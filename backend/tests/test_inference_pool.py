@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.utils import inference_pool  # noqa: E402
+from app.utils.inference_pool import InferencePool  # noqa: E402
+
+
+def test_timed_out_task_keeps_its_queue_slot_until_it_finishes(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(inference_pool, "_run_task", lambda task, images: release.wait(5) and len(images))
+    pool = InferencePool(workers=0, max_pending=2, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run("detect", [object(), object()])
+        # Задача еще выполняется в пуле: место в очереди занято, вызов не считается завершенным
+        assert pool.pending == 2 and pool.completed == 0 and pool.timeouts == 1
+        with pytest.raises(inference_pool.PoolSaturatedError):
+            await pool.run("detect", [object()])
+        release.set()
+        for _ in range(100):
+            if pool.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.pending == 0 and pool.completed == 0
+        pool.timeout = 1
+        assert await pool.run("detect", [object()]) == 1
+        assert pool.pending == 0 and pool.completed == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
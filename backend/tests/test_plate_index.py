@@ -0,0 +1,144 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.db.models import Booking  # noqa: E402
+from app.utils import plate_index  # noqa: E402
+from app.utils.plate_index import ActivePlateIndex, FuzzyPlateIndex, FUZZY_COST_LIMIT  # noqa: E402
+from app.utils.plates import plate_distance  # noqa: E402
+
+
+@pytest.fixture
+def index():
+    now = datetime.now()
+    index = ActivePlateIndex()
+    index.add(SimpleNamespace(id=1, car_plate="а123вс77", start_time=now - timedelta(hours=1),
+                              end_time=now + timedelta(hours=1)))
+    return index
+
+
+@pytest.mark.parametrize("plate, cost", [
+    ("А123ВС77", 0.0),
+    ("A123BC77", 0.0),      # латинские двойники
+    ("а123 вс-77", 0.0),
+    ("4123ВС77", 0.5),      # А/4
+    ("А123ВО77", 0.5),      # С/О
+    ("А123ВС7Т", 0.4),      # 7/Т
+])
+def test_gate_match_allows_exact_and_cheap_confusions(index, plate, cost):
+    found = index.match(plate)
+    assert found is not None
+    assert found["booking_id"] == 1
+    assert found["cost"] == pytest.approx(cost)
+
+
+@pytest.mark.parametrize("plate", [
+    "А123ВС78",     # другой регион
+    "Х123ВС77",     # другая буква
+    "А123ВС777",    # лишний символ
+    "А123ВС7",      # пропущенный символ
+    "Т723АВ77",     # несколько путаниц дороже допуска
+])
+def test_gate_match_rejects_other_plates(index, plate):
+    assert index.match(plate) is None
+
+
+def test_gate_match_outside_booking_window(index):
+    assert index.match("А123ВС77", at=datetime.now() + timedelta(days=1)) is None
+
+
+def test_fuzzy_search_finds_two_edits_within_budget():
+    fuzzy = FuzzyPlateIndex()
+    fuzzy.add("Т123АВ77", "т123ав77")
+    assert plate_distance("71234В77", "Т123АВ77") == pytest.approx(0.9)
+    assert fuzzy.search("71234В77", max_cost=1.0) == [("Т123АВ77", "т123ав77", pytest.approx(0.9))]
+
+
+def test_fuzzy_search_rejects_unanswerable_budget():
+    with pytest.raises(ValueError):
+        FuzzyPlateIndex().search("А123ВС77", max_cost=FUZZY_COST_LIMIT)
+
+
+def test_fuzzy_search_matches_brute_force():
+    rng = random.Random(0)
+    letters, digits = "АВЕКМНОРСТУХ", "0123456789"
+
+    def plate():
+        return (rng.choice(letters) + "".join(rng.choices(digits, k=3)) + "".join(rng.choices(letters, k=2))
+                + "".join(rng.choices(digits, k=rng.choice([2, 3]))))
+
+    def mutate(key):
+        chars = list(key)
+        for _ in range(rng.randint(0, 3)):
+            i, op = rng.randrange(len(chars)), rng.random()
+            if op < 0.5:
+                chars[i] = rng.choice(letters + digits)
+            elif op < 0.75:
+                del chars[i]
+            else:
+                chars.insert(i, rng.choice(letters + digits))
+        return "".join(chars)
+
+    keys = sorted({plate() for _ in range(300)})
+    fuzzy = FuzzyPlateIndex()
+    fuzzy.reload((key, key) for key in keys)
+    for _ in range(100):
+        query = mutate(rng.choice(keys))
+        found = {key for key, _, _ in fuzzy.search(query, max_cost=1.1, limit=len(keys))}
+        assert found == {key for key in keys if plate_distance(query, key, 1.1) <= 1.1}
+
+
+def _book(db, booking_id, car_plate, hours=1):
+    now = datetime.now()
+    db.add(Booking(id=booking_id, resident_id=1, spot_id=1, car_plate=car_plate,
+                   start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=hours)))
+    db.commit()
+
+
+def test_refresh_sees_changes_from_other_processes(db):
+    index = ActivePlateIndex()
+    _book(db, 10, "А123ВС77")
+    index.refresh(db)
+    # Бронь с меньшим id, зафиксированная позже, и отмена в другом процессе
+    _book(db, 5, "К456МН99")
+    db.query(Booking).filter(Booking.id == 10).delete()
+    db.commit()
+    assert index.refresh(db) is False
+    assert index.find_booking("К456МН99") == 5
+    assert index.find_booking("А123ВС77") is None
+
+
+def test_refresh_does_not_restore_booking_cancelled_during_read(db, monkeypatch):
+    index = ActivePlateIndex()
+    index.refresh(db)
+    _book(db, 1, "А123ВС77")
+    read = plate_index.changed_bookings
+
+    # Отмена в этом процессе, пока строки из БД уже прочитаны, но еще не применены
+    def read_then_cancel(*args):
+        rows = read(*args)
+        index.remove(1)
+        return rows
+
+    monkeypatch.setattr(plate_index, "changed_bookings", read_then_cancel)
+    index.refresh(db)
+    assert index.find_booking("А123ВС77") is None
+
+
+def test_reload_keeps_booking_created_during_read(db, monkeypatch):
+    index = ActivePlateIndex()
+    now = datetime.now()
+    read = index._rows
+
+    def read_then_book(session):
+        rows = read(session)
+        index.add(SimpleNamespace(id=7, car_plate="А123ВС77", start_time=now, end_time=now + timedelta(hours=1)))
+        return rows
+
+    monkeypatch.setattr(index, "_rows", read_then_book)
+    index.reload(db)
+    assert index.find_booking("А123ВС77") == 7
@@ -0,0 +1,18 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+pytest.importorskip("aiosqlite")
+pytest.importorskip("numpy")
+
+from app.utils import db_benchmark  # noqa: E402
+
+
+def test_endpoints_stay_within_query_budgets(db):
+    db_benchmark.seed(residents=3, spots=5)
+    report = asyncio.run(db_benchmark.check_query_budgets())
+    assert set(report) == set(db_benchmark.QUERY_BUDGETS)
+    for name, result in report.items():
+        assert 0 < result["queries"] <= result["budget"], (name, result["statements"])
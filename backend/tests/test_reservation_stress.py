@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+pytest.importorskip("aiosqlite")
+pytest.importorskip("numpy")
+
+from app.utils import reservation_stress  # noqa: E402
+
+
+def test_concurrent_reservations_never_overlap(db):
+    reservation_stress.seed(3)
+    report = asyncio.run(reservation_stress.run(spots=3, requests=50, concurrency=16, slots=6, max_length=3))
+    assert report["overlaps"] == []
+    assert report["spurious_rejections"] == []
+    assert report["outcomes"].get("errors", 0) == 0
+    assert report["outcomes"].get("booked", 0) == report["stored_bookings"] > 0
@@ -108,14 +108,23 @@ class UserListWidget(QWidget):
             self.all_buttons.append(user_button)
 
 
-def fetch_residents():
+# Все жители постранично: следующая страница запрашивается по next_after_id
+def fetch_residents(page_size=500):
         url = "http://localhost:8000/parking/residents"
+        residents, after_id = [], None
 
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("residents", [])
+            while True:
+                params = {"limit": page_size}
+                if after_id is not None:
+                    params["after_id"] = after_id
+                response = requests.get(url, params=params)
+                response.raise_for_status()
+                data = response.json()
+                residents.extend(data.get("residents", []))
+                after_id = data.get("next_after_id")
+                if after_id is None:
+                    return residents
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при запросе к API: {e}")
             return []
\ No newline at end of file
@@ -1,16 +1,172 @@
-import cv2
+"""
+Обучение детектора номерных табличек YOLOv8 на локальном датасете.
+
+Примеры:
+    python fit_yolo.py --data ./datasets/plates/data.yaml --epochs 50 --cache ram
+    python fit_yolo.py --data ./datasets/plates --device cpu --workers 8 --batch 8
+    python fit_yolo.py --resume                       # продолжить последнее обучение
+    ROBOFLOW_API_KEY=... python fit_yolo.py --roboflow --data ./datasets/plates
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
 import torch
 from ultralytics import YOLO  # Используем YOLOv8 для детекции объектов
-import easyocr  # Библиотека для распознавания текста
-from roboflow import Roboflow
 
-rf = Roboflow(api_key="5pXFfA6Z3uRGVkNdeUMD")
-project = rf.workspace("roboflow-universe-projects").project("license-plate-recognition-rxg4e")
-version = project.version(4)
-dataset = version.download("yolov8")
+ROBOFLOW_WORKSPACE = "roboflow-universe-projects"
+ROBOFLOW_PROJECT = "license-plate-recognition-rxg4e"
+ROBOFLOW_VERSION = 4
+
+
+def resolve_device(device):
+    if device != "auto":
+        return device
+    if torch.cuda.is_available():
+        return "0"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+# Путь к data.yaml: можно передать сам файл или каталог датасета
+def resolve_data(data):
+    if os.path.isdir(data):
+        data = os.path.join(data, "data.yaml")
+    return data
+
+
+# Однократная загрузка датасета Roboflow в каталог датасета (ключ - из переменной окружения)
+def download_roboflow(dataset_dir):
+    data_yaml = os.path.join(dataset_dir, "data.yaml")
+    if os.path.exists(data_yaml):
+        print(f"Датасет уже загружен: {data_yaml}")
+        return data_yaml
+
+    api_key = os.getenv("ROBOFLOW_API_KEY")
+    if not api_key:
+        raise SystemExit("Для загрузки датасета задайте переменную окружения ROBOFLOW_API_KEY")
+    from roboflow import Roboflow
+
+    rf = Roboflow(api_key=api_key)
+    project = rf.workspace(ROBOFLOW_WORKSPACE).project(ROBOFLOW_PROJECT)
+    dataset = project.version(ROBOFLOW_VERSION).download("yolov8", location=dataset_dir)
+    return os.path.join(dataset.location, "data.yaml")
+
+
+# Последний чекпоинт обучения (last.pt) в каталоге проекта
+def find_last_checkpoint(project):
+    checkpoints = glob.glob(os.path.join(project, "*", "weights", "last.pt"))
+    return max(checkpoints, key=os.path.getmtime) if checkpoints else None
+
+
+class EpochStats:
+    """
+    Время эпохи и скорость обучения (изображений в секунду) через колбэки ultralytics.
+    Результаты пишутся построчно в epoch_stats.jsonl в каталоге обучения.
+    """
+
+    def __init__(self):
+        self.epoch_started = None
+        self.records = []
+
+    def on_train_epoch_start(self, trainer):
+        self.epoch_started = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer):
+        seconds = time.perf_counter() - self.epoch_started
+        images = len(trainer.train_loader.dataset)
+        record = {
+            "epoch": trainer.epoch + 1,
+            "epoch_time_s": round(seconds, 3),
+            "images": images,
+            "images_per_s": round(images / seconds, 2) if seconds else None,
+        }
+        self.records.append(record)
+        print(f"Эпоха {record['epoch']}: {record['epoch_time_s']:.1f} с, {record['images_per_s']} изобр./с")
+        with open(os.path.join(trainer.save_dir, "epoch_stats.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def attach(self, model):
+        model.add_callback("on_train_epoch_start", self.on_train_epoch_start)
+        model.add_callback("on_train_epoch_end", self.on_train_epoch_end)
+
+
+def train(args):
+    device = resolve_device(args.device)
+    if device == "cpu":
+        # На CPU потоки torch делятся с воркерами загрузки данных
+        torch.set_num_threads(max(1, (os.cpu_count() or 2) - args.workers))
+
+    stats = EpochStats()
+    if args.resume:
+        checkpoint = args.resume if isinstance(args.resume, str) else find_last_checkpoint(args.project)
+        if not checkpoint or not os.path.exists(checkpoint):
+            raise SystemExit("Чекпоинт для продолжения обучения не найден")
+        print(f"Продолжение обучения с {checkpoint}")
+        model = YOLO(checkpoint)
+        stats.attach(model)
+        model.train(resume=True, device=device, workers=args.workers)
+        return stats
+
+    data = download_roboflow(args.data) if args.roboflow else resolve_data(args.data)
+    if not os.path.exists(data):
+        raise SystemExit(f"Не найден файл датасета {data}")
+
+    # Загрузка предобученной модели YOLOv8
+    model = YOLO(args.model)
+    stats.attach(model)
+    model.train(
+        data=data,
+        epochs=args.epochs,
+        imgsz=args.imgsz,
+        batch=args.batch,
+        device=device,
+        workers=args.workers,
+        cache=False if args.cache == "none" else args.cache,
+        patience=args.patience,
+        project=args.project,
+        name=args.name,
+        exist_ok=args.exist_ok,
+        amp=device != "cpu",
+        plots=not args.no_plots,
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обучение детектора номерных табличек YOLOv8")
+    parser.add_argument("--data", default="./datasets/license-plates",
+                        help="data.yaml или каталог датасета в формате YOLOv8")
+    parser.add_argument("--model", default="yolov8n.pt", help="начальные веса (yolov8n.pt или свой чекпоинт)")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=16, help="размер батча (-1 - подобрать по памяти GPU)")
+    parser.add_argument("--device", default="auto", help="auto, cpu, mps, 0, 0,1 ...")
+    parser.add_argument("--workers", type=int, default=max(1, min(8, (os.cpu_count() or 2) // 2)),
+                        help="процессов загрузки данных")
+    parser.add_argument("--cache", choices=("ram", "disk", "none"), default="ram",
+                        help="кэш декодированных и уменьшенных изображений")
+    parser.add_argument("--patience", type=int, default=20, help="эпох без улучшения до остановки")
+    parser.add_argument("--project", default="./runs/detect", help="каталог результатов обучения")
+    parser.add_argument("--name", default="train")
+    parser.add_argument("--exist-ok", action="store_true", help="перезаписывать каталог обучения с тем же именем")
+    parser.add_argument("--resume", nargs="?", const=True, default=False,
+                        help="продолжить обучение с last.pt (путь или последний в --project)")
+    parser.add_argument("--roboflow", action="store_true",
+                        help="загрузить датасет Roboflow в --data, если его там еще нет (ROBOFLOW_API_KEY)")
+    parser.add_argument("--no-plots", action="store_true", help="не строить графики после обучения")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = train(args)
+    total = time.perf_counter() - started
+    if stats.records:
+        mean_speed = sum(r["images_per_s"] or 0 for r in stats.records) / len(stats.records)
+        print(f"\nОбучение завершено за {total / 60:.1f} мин, в среднем {mean_speed:.1f} изобр./с\n")
 
-# Загрузка предобученной модели YOLOv8
-model = YOLO('yolov8n.pt')
 
-# Обучение модели
-results = model.train(data=f"{dataset.location}/data.yaml", epochs=10, imgsz=640, device='cuda')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,39 @@
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
 import cv2
 import torch
 from ultralytics import YOLO  # Используем YOLOv8 для детекции объектов
 import easyocr  # Библиотека для распознавания текста
-import os
-import numpy as np
-from roboflow import Roboflow
+
+DEFAULT_WEIGHTS = './runs/detect/train/weights/best.pt'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# Кэш моделей YOLO: веса загружаются один раз на процесс
+_models = {}
+
+def get_model(weights=DEFAULT_WEIGHTS):
+    model = _models.get(weights)
+    if model is None:
+        model = YOLO(weights)
+        _models[weights] = model
+    return model
 
 # Обнаружение номерной таблички
 # Возвращает координаты bounding box
-def detect_license_plate(image_path, model):
+def detect_license_plate(image_path, model, image=None):
     # Загружаем изображение
-    image = cv2.imread(image_path)
+    if image is None:
+        image = cv2.imread(image_path)
 
     # Используем модель для предсказания
-    results = model(image)
+    results = model(image, verbose=False)
 
     # Получаем координаты bounding box'а
     for result in results:
@@ -43,10 +63,20 @@ def preprocess_license_plate(image, bbox):
 
     return blurred
 
+# Кэш OCR-движков: веса easyocr загружаются один раз на процесс
+_readers = {}
+
+def get_reader(langs=('ru',)):
+    reader = _readers.get(langs)
+    if reader is None:
+        reader = easyocr.Reader(list(langs), gpu=torch.cuda.is_available())
+        _readers[langs] = reader
+    return reader
+
 # Распознавание текста с помощью EasyOCR
-def recognize_text(image):
-    reader = easyocr.Reader(['ru'], gpu=True)  # Инициализация OCR
-    results = reader.readtext(image)
+def recognize_text(image, allowlist=None):
+    reader = get_reader()
+    results = reader.readtext(image, allowlist=allowlist)
 
     # Обработка результатов
     for detection in results:
@@ -61,8 +91,8 @@ def recognize_text(image):
 # 2. Улучшение качества изображения
 # 3. Распознавание текста
 def pipline_image(image_path):
-    # Загрузка обученной модели YOLOv8
-    model = YOLO('./runs/detect/train/weights/best.pt')
+    # Загрузка обученной модели YOLOv8 (из кэша процесса)
+    model = get_model()
 
     # Обнаружение номерной таблички
     bbox = detect_license_plate(image_path, model)
@@ -102,4 +132,161 @@ def pipline_image(image_path):
 #      else:
 #        print("Неподдерживаемый формат")
 #else:
-#    print("Картинка не была загружена")
\ No newline at end of file
+#    print("Картинка не была загружена")
+
+
+# Пакетная офлайн-обработка архивов снимков
+# Инициализация процесса-обработчика: модели загружаются один раз на процесс
+def _init_worker(weights, threads):
+    global _worker_weights
+    _worker_weights = weights
+    torch.set_num_threads(threads)
+    get_model(weights)
+    get_reader()
+
+_worker_weights = DEFAULT_WEIGHTS
+
+# Обработка одного файла; возвращает запись для JSONL/CSV
+def process_image(image_path):
+    start = time.perf_counter()
+    record = {"path": image_path, "status": "ok", "bbox": None, "detection_score": None,
+              "license_plate": None, "confidence": None, "error": None}
+    try:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError("не удалось прочитать изображение")
+
+        bbox = detect_license_plate(image_path, get_model(_worker_weights), image=image)
+        if bbox is None:
+            record["status"] = "no_plate"
+        else:
+            x1, y1, x2, y2, score = bbox
+            record["bbox"] = [x1, y1, x2, y2]
+            record["detection_score"] = float(score)
+            text, text_score = recognize_text(preprocess_license_plate(image, (x1, y1, x2, y2)))
+            if text is None:
+                record["status"] = "no_text"
+            else:
+                record["license_plate"] = text
+                record["confidence"] = float(text_score)
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+    return record
+
+# Список изображений по каталогу (рекурсивно) или glob-шаблону
+def collect_inputs(source):
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, '**', '*'), recursive=True)
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(os.path.abspath(p) for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+
+class ResultWriter:
+    """
+    Инкрементальная запись результатов в JSONL или CSV (по расширению файла),
+    каждая запись сразу сбрасывается на диск для продолжения после сбоя.
+    """
+    FIELDS = ["path", "status", "bbox", "detection_score", "license_plate", "confidence", "error", "elapsed_ms"]
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.is_csv = output_path.lower().endswith('.csv')
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self._file = open(output_path, 'a', encoding='utf-8', newline='')
+        if self.is_csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+            if new_file:
+                self._writer.writeheader()
+
+    def write(self, record):
+        if self.is_csv:
+            self._writer.writerow({**record, "bbox": json.dumps(record["bbox"]) if record["bbox"] else ""})
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    # Пути, уже записанные в файл результатов (оборванная последняя строка игнорируется)
+    @staticmethod
+    def processed_paths(output_path):
+        done = set()
+        if not os.path.exists(output_path):
+            return done
+        with open(output_path, encoding='utf-8', newline='') as f:
+            if output_path.lower().endswith('.csv'):
+                for row in csv.DictReader(f):
+                    if row.get("path") and row.get("status"):
+                        done.add(row["path"])
+            else:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)["path"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+        return done
+
+def _report_progress(processed, total, started, final=False):
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed else 0.0
+    eta = (total - processed) / rate if rate else 0.0
+    end = "\n" if final else "\r"
+    sys.stderr.write(f"{processed}/{total} изображений, {rate:.1f} изобр/с, осталось ~{eta:.0f} с{end}")
+    sys.stderr.flush()
+
+# Параллельная обработка каталога/шаблона N процессами с записью результатов по мере готовности
+def run_batch(source, output_path, workers=1, weights=DEFAULT_WEIGHTS, resume=True):
+    inputs = collect_inputs(source)
+    done = ResultWriter.processed_paths(output_path) if resume else set()
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+    todo = [path for path in inputs if path not in done]
+    print(f"Найдено {len(inputs)} изображений, уже обработано {len(inputs) - len(todo)}, к обработке {len(todo)}",
+          file=sys.stderr)
+    if not todo:
+        return
+
+    writer = ResultWriter(output_path)
+    started, last_report, processed = time.perf_counter(), 0.0, 0
+    threads = max(1, (os.cpu_count() or 1) // max(workers, 1))
+    pool = None
+    try:
+        if workers <= 1:
+            _init_worker(weights, threads)
+            records = map(process_image, todo)
+        else:
+            pool = multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker,
+                                                             initargs=(weights, threads))
+            records = pool.imap_unordered(process_image, todo, chunksize=4)
+        for record in records:
+            writer.write(record)
+            processed += 1
+            if time.perf_counter() - last_report >= 1.0:
+                _report_progress(processed, len(todo), started)
+                last_report = time.perf_counter()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        # Ошибка или Ctrl+C посреди прогона: процессы пула не должны пережить родителя
+        if pool is not None:
+            pool.terminate()
+        writer.close()
+    _report_progress(processed, len(todo), started, final=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное распознавание номеров на архивах снимков")
+    parser.add_argument("source", help="каталог с изображениями или glob-шаблон, например 'archive/**/*.jpg'")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="файл результатов (.jsonl или .csv)")
+    parser.add_argument("-w", "--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="число процессов-обработчиков")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="путь к весам YOLO")
+    parser.add_argument("--no-resume", action="store_true", help="начать заново, удалив файл результатов")
+    args = parser.parse_args()
+    run_batch(args.source, args.output, args.workers, args.weights, resume=not args.no_resume)
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,12 @@ logger = logging.getLogger(__name__)
 API_TOKEN = os.getenv('TELEGRAM_BOT_ML_API_KEY')
 API_ENDPOINT_URL = os.getenv('API_ENDPOINT_URL_ML')
 RECOGNIZE_URL = f"http://backend:8000/ml/recognize-license-plate"
+JOBS_URL = os.getenv("ML_JOBS_URL", "http://backend:8000/ml/jobs")
+# Таймаут одного HTTP-запроса к ML API и общее время ожидания результата задания (сек)
+ML_API_TIMEOUT = float(os.getenv("ML_API_TIMEOUT", "30"))
+ML_JOB_WAIT_TIMEOUT = float(os.getenv("ML_JOB_WAIT_TIMEOUT", "60"))
+# Распознавание через очередь заданий /ml/jobs вместо синхронного запроса
+USE_ML_JOBS = os.getenv("USE_ML_JOBS", "1") == "1"
 
 # Проверка токена
 if not API_TOKEN:
@@ -43,25 +49,61 @@ async def call_ml_api(image_bytes: bytes, endpoint_url: str):
     """Отправляет изображение в указанный API-эндпоинт"""
     logger.info("ML API called (image size: %d bytes)", len(image_bytes))
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=ML_API_TIMEOUT)) as session:
             data = aiohttp.FormData()
             data.add_field('file',
                            image_bytes,
                            filename='image.jpg',
                            content_type='image/jpeg')
             async with session.post(endpoint_url, data=data) as response:
-                if response.status == 200:
+                if response.status in (200, 202):
                     result = await response.json()
                     logger.info("ML API response: %s", result)
                     return result
                 else:
                     logger.error("ML API returned error: %d", response.status)
                     return None
+    except asyncio.TimeoutError:
+        logger.error("ML API request timed out after %.0f s", ML_API_TIMEOUT)
+        return None
     except Exception as e:
         logger.exception("Network error while calling ML API:")
         return None
 
 
+async def recognize_via_job(image_bytes: bytes):
+    """Ставит изображение в очередь /ml/jobs и ждет результат long-poll запросами"""
+    job = await call_ml_api(image_bytes, JOBS_URL)
+    if not job or "job_id" not in job:
+        return None
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ML_JOB_WAIT_TIMEOUT
+    wait = min(10.0, ML_API_TIMEOUT / 2)
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=ML_API_TIMEOUT)) as session:
+            while loop.time() < deadline:
+                url = f"{JOBS_URL}/{job['job_id']}"
+                async with session.get(url, params={"wait": wait}) as response:
+                    if response.status != 200:
+                        logger.error("ML job status returned error: %d", response.status)
+                        return None
+                    job = await response.json()
+                if job["status"] == "done":
+                    return job["result"]
+                if job["status"] in ("failed", "expired"):
+                    logger.error("ML job %s %s: %s", job["job_id"], job["status"], job["error"])
+                    return None
+    except asyncio.TimeoutError:
+        logger.error("ML job status request timed out")
+        return None
+    except Exception:
+        logger.exception("Network error while polling ML job:")
+        return None
+    logger.error("ML job %s did not finish in %.0f s", job["job_id"], ML_JOB_WAIT_TIMEOUT)
+    return None
+
+
 # --- Обработчики сообщений ---
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -103,7 +145,10 @@ async def handle_car_photo(message: types.Message):
         logger.info("Photo downloaded, size: %d bytes", len(image_bytes))
 
         # === 2. Распознавание текста на номерном знаке (recognize) ===
-        recognize_result = await call_ml_api(image_bytes, RECOGNIZE_URL)
+        if USE_ML_JOBS:
+            recognize_result = await recognize_via_job(image_bytes)
+        else:
+            recognize_result = await call_ml_api(image_bytes, RECOGNIZE_URL)
         if recognize_result and "license_plate" in recognize_result:
             plate_number = recognize_result["license_plate"]
             confidence = recognize_result["confidence"]